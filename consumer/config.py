@@ -18,6 +18,10 @@ class Settings(BaseSettings):
     ucam_username: str = ""
     ucam_password: str = ""
 
+    # Connections kept alive per host and retries of transient errors (HTTP 5xx)
+    http_pool_size: int = 10
+    http_retries: int = 3
+
 
 @lru_cache()
 def settings() -> Settings:
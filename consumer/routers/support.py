@@ -1,19 +1,19 @@
 # See https://docs.zammad.org/en/latest/api/intro.html
-import requests
 from fastapi import APIRouter, HTTPException
 
 from consumer.config import config
+from data_transfer.utils import http
 
 router = APIRouter()
 
 headers = {"Authorization": f"Bearer {config.support_token}"}
 
+session = http.build_session(config.http_pool_size, config.http_retries)
+
 
 @router.get("/users")
 async def users() -> list:
-    get_users_response = requests.get(
-        f"{config.support_base_url}users", headers=headers
-    )
+    get_users_response = session.get(f"{config.support_base_url}users", headers=headers)
     if 400 <= get_users_response.status_code < 500:
         raise HTTPException(
             status_code=get_users_response.status_code, detail="General Error"
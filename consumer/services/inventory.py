@@ -1,16 +1,17 @@
 from typing import Any
 
-import requests
-
 from consumer.config import config
 from consumer.utils.errors import CustomException
+from data_transfer.utils import http
+
+session = http.build_session(config.http_pool_size, config.http_retries)
 
 
 async def response(path: str, params: dict = None) -> Any:
     """Helper method to share validation across requests."""
     headers = {"Authorization": f"Bearer {config.inventory_token}"}
     url = f"{config.inventory_base_url}/{path}"
-    res = requests.get(url, params=params, headers=headers)
+    res = session.get(url, params=params, headers=headers)
 
     res.raise_for_status()
 
@@ -3,9 +3,11 @@ from collections import defaultdict
 from datetime import datetime
 from typing import List, Optional
 
-import requests
-
+from consumer.config import config
 from consumer.schemas.ucam import DeviceWithPatients, Patient, PatientWithDevices
+from data_transfer.utils import http
+
+session = http.build_session(config.http_pool_size, config.http_retries)
 
 
 def ucam_access_token() -> str:
@@ -21,7 +23,7 @@ def ucam_access_token() -> str:
             "Password": os.getenv("UCAM_PASSWORD"),
         }
 
-        response = requests.post(f"{os.getenv('UCAM_URI')}/user/login", json=request)
+        response = session.post(f"{os.getenv('UCAM_URI')}/user/login", json=request)
         response.raise_for_status()
         result: dict = response.json()
         access_token = result["token"]
@@ -40,7 +42,7 @@ def response(request_url: str) -> Optional[dict]:
     headers = {"Authorization": f"Bearer {ucam_access_token()}"}
     url = f"{os.getenv('UCAM_URI')}{request_url}"
 
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
     response.raise_for_status()
 
     # possibly no result
@@ -2,12 +2,14 @@ import logging
 from datetime import datetime
 
 from data_transfer.config import config
-from data_transfer.db import all_records_downloaded, records_not_uploaded
+from data_transfer.db import all_records_downloaded, record_summaries_not_uploaded
 from data_transfer.devices.byteflies import Byteflies
 from data_transfer.jobs import byteflies as byteflies_jobs
 from data_transfer.jobs import shared as shared_jobs
+from data_transfer.schemas.record import RecordSummary
 from data_transfer.tasks import byteflies as byteflies_tasks
 from data_transfer.utils import DeviceType, StudySite, get_period_by_days
+from data_transfer.utils.concurrency import run_concurrently
 
 log = logging.getLogger(__name__)
 
@@ -46,19 +48,25 @@ def dag(study_site: StudySite, days: int = 50, delta: int = 0) -> None:
 
     byteflies_jobs.batch_metadata(byteflies, *data_period)
 
-    results = records_not_uploaded(DeviceType.BTF)
+    groups = record_summaries_not_uploaded(DeviceType.BTF)
+
+    def download_and_preprocess(record: RecordSummary) -> str:
+        # Each task should be idempotent. Returned values feeds subsequent task
+        mongoid = byteflies_tasks.task_download_data(byteflies, record.id)
+        return byteflies_tasks.task_preprocess_data(mongoid)
 
     # NOTE: group records by patients per device to process small batches.
-    for patient_device, records in results.items():
-        for record in records:
-            # Each task should be idempotent. Returned values feeds subsequent task
-            mongoid = byteflies_tasks.task_download_data(byteflies, record.id)
-            byteflies_tasks.task_preprocess_data(mongoid)
+    for patient_device, records in groups:
+        # Files within a group are downloaded concurrently
+        # NOTE: requests to the Byteflies API are rate limited in lib.byteflies
+        run_concurrently(
+            download_and_preprocess, records, config.byteflies_max_downloads
+        )
 
         # Only upload when all records are ready
         if all_records_downloaded(records):
             log.debug(f"All records for {patient_device} DOWNLOADED -> PREPARING ...")
-            shared_jobs.prepare_data_folders(DeviceType.BTF)
+            shared_jobs.prepare_data_folders(DeviceType.BTF, records)
             log.debug(f"All records for {patient_device} PREPARED   -> UPLOADING ...")
             shared_jobs.batch_upload_data(DeviceType.BTF)
         else:
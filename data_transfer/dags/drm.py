@@ -1,16 +1,19 @@
 import logging
 
-from data_transfer.db import all_records_downloaded, records_not_uploaded
+from data_transfer.config import config
+from data_transfer.db import all_records_downloaded, record_summaries_not_uploaded
 from data_transfer.devices.dreem import Dreem
 from data_transfer.jobs import dreem as dreem_jobs
 from data_transfer.jobs import shared as shared_jobs
+from data_transfer.schemas.record import RecordSummary
 from data_transfer.tasks import dreem as dreem_tasks
 from data_transfer.utils import DeviceType, StudySite
+from data_transfer.utils.concurrency import RateLimiter, run_concurrently
 
 log = logging.getLogger(__name__)
 
 
-def dag(study_site: StudySite) -> None:
+def dag(study_site: StudySite, full: bool = False) -> None:
     """
     Directed acyclic graph (DAG) representing dreem data pipeline:
 
@@ -20,26 +23,37 @@ def dag(study_site: StudySite) -> None:
             ->task_prepare_data
         ->batch_upload_data
 
+    If full, all of the study site's records are listed, not only new records.
+
     NOTE/TODO: this method simulates the pipeline.
     """
     # NOTE: authenticate once as stay-alive time is long
     # TODO: refactor inside Dreem class to keep session alive.
     dreem = Dreem(study_site)
+    limiter = RateLimiter(config.dreem_downloads_per_second)
+
+    dreem_jobs.batch_metadata(dreem, full)
 
-    dreem_jobs.batch_metadata(dreem)
+    groups = record_summaries_not_uploaded(DeviceType.DRM)
 
-    results = records_not_uploaded(DeviceType.DRM)
+    def download_and_preprocess(record: RecordSummary) -> str:
+        # Each task should be idempotent. Returned values feeds subsequent task
+        mongoid = dreem_tasks.task_download_data(dreem, record.id)
+        return dreem_tasks.task_preprocess_data(mongoid)
 
     # NOTE: group records by patients per device to process small batches.
-    for patient_device, records in results.items():
-        for record in records:
-            # Each task should be idempotent. Returned values feeds subsequent task
-            mongoid = dreem_tasks.task_download_data(dreem, record.id)
-            dreem_tasks.task_preprocess_data(mongoid)
+    for patient_device, records in groups:
+        # Files within a group are downloaded concurrently
+        run_concurrently(
+            download_and_preprocess,
+            records,
+            config.dreem_max_downloads,
+            limiter,
+        )
         # Only upload when all records are ready
         if all_records_downloaded(records):
             log.debug(f"All records for {patient_device} DOWNLOADED -> PREPARING ...")
-            shared_jobs.prepare_data_folders(DeviceType.DRM)
+            shared_jobs.prepare_data_folders(DeviceType.DRM, records)
             log.debug(f"All records for {patient_device} PREPARED   -> UPLOADING ...")
             shared_jobs.batch_upload_data(DeviceType.DRM)
         else:
@@ -1,6 +1,6 @@
 import logging
 
-from data_transfer.db import records_not_uploaded
+from data_transfer.db import record_summaries_not_uploaded
 from data_transfer.devices.thinkfast import ThinkFast
 from data_transfer.jobs import shared as shared_jobs
 from data_transfer.tasks import thinkfast as thinkfast_tasks
@@ -26,15 +26,15 @@ def dag(study_site: StudySite) -> None:
 
     # step 1. get all new records
     thinkfast.download_participants_data()
-    results = records_not_uploaded(DeviceType.TFA)
+    groups = record_summaries_not_uploaded(DeviceType.TFA)
 
     # step 2. preprocess data
-    for _patient_device, records in results.items():
+    for _patient_device, records in groups:
         for record in records:
             # Each task should be idempotent. Returned values feeds subsequent task
             thinkfast_tasks.task_preprocess_data(record.id)
 
         # step 3. prepare data for uploadingData by moving data to a folder in /uploading/
-        shared_jobs.prepare_data_folders(DeviceType.TFA)
+        shared_jobs.prepare_data_folders(DeviceType.TFA, records)
         # step 4. Upload the data to the dmp
         shared_jobs.batch_upload_data(DeviceType.TFA)
@@ -0,0 +1,121 @@
+"""
+Declares the indexes of the records collection, one per query shape in db.main.
+
+Partial indexes only hold the records still pending a stage, e.g. not yet
+uploaded, so they stay small as the history of uploaded records grows.
+"""
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, IndexModel
+
+from data_transfer.db import main as db
+
+log = logging.getLogger(__name__)
+
+# Options compared when checking if a declared index differs from the DB
+INDEX_OPTIONS = ["unique", "partialFilterExpression"]
+
+RECORD_INDEXES = [
+    # unknown_hashes
+    IndexModel([("hash", ASCENDING)], name="hash_1", unique=True),
+    # records_by_dmp_folder
+    IndexModel([("dmp_folder", ASCENDING)], name="dmp_folder"),
+    # records_not_downloaded
+    IndexModel(
+        [("device_type", ASCENDING), ("is_downloaded", ASCENDING)],
+        name="not_downloaded",
+        partialFilterExpression={"is_downloaded": False},
+    ),
+    # records_not_uploaded and record_summaries_not_uploaded (by group)
+    IndexModel(
+        [
+            ("device_type", ASCENDING),
+            ("is_uploaded", ASCENDING),
+            ("patient_id", ASCENDING),
+            ("device_id", ASCENDING),
+        ],
+        name="not_uploaded",
+        partialFilterExpression={"is_uploaded": False},
+    ),
+    # records_processed_and_not_uploaded
+    IndexModel(
+        [
+            ("device_type", ASCENDING),
+            ("is_processed", ASCENDING),
+            ("is_downloaded", ASCENDING),
+        ],
+        name="processed_not_uploaded",
+        partialFilterExpression={"is_uploaded": False},
+    ),
+]
+
+# Representative filters used to explain() each query shape
+QUERY_SHAPES = {
+    "unknown_hashes": {"hash": {"$in": [""]}},
+    "records_by_dmp_folder": {"dmp_folder": ""},
+    "records_not_downloaded": {"is_downloaded": False, "device_type": "BTF"},
+    "records_not_uploaded": {"is_uploaded": False, "device_type": "BTF"},
+    "record_summaries_not_uploaded": {
+        "is_uploaded": False,
+        "device_type": "BTF",
+        "patient_id": "",
+        "device_id": "",
+    },
+    "records_processed_and_not_uploaded": {
+        "is_uploaded": False,
+        "is_processed": True,
+        "is_downloaded": True,
+        "device_type": "BTF",
+    },
+}
+
+
+def apply_indexes() -> List[str]:
+    """
+    Creates the declared indexes. Safe to run on every startup: existing
+    indexes are left as-is, and those whose declaration changed are rebuilt.
+    """
+    existing = db._db.records.index_information()
+
+    for index in RECORD_INDEXES:
+        spec = index.document
+        name = spec["name"]
+        if name in existing and not __same_index(spec, existing[name]):
+            log.info(f"Index ({name}) declaration changed. Rebuilding.")
+            db._db.records.drop_index(name)
+
+    names: List[str] = db._db.records.create_indexes(RECORD_INDEXES)
+    return names
+
+
+def index_usage() -> Dict[str, str]:
+    """Name of the index(es) the DB selects for each query shape, or COLLSCAN."""
+    usage = {}
+    for query, filters in QUERY_SHAPES.items():
+        plan = db._db.records.find(filters).explain()["queryPlanner"]["winningPlan"]
+        usage[query] = ", ".join(__index_names(plan)) or "COLLSCAN"
+    return usage
+
+
+def log_index_usage() -> None:
+    for query, index in index_usage().items():
+        log.info(f"{query}: {index}")
+
+
+def __same_index(declared: dict, existing: dict) -> bool:
+    """True if an index in the DB matches its declaration (keys and options)."""
+    same_keys = list(declared["key"].items()) == list(existing["key"])
+    same_options = all(
+        declared.get(option) == existing.get(option) for option in INDEX_OPTIONS
+    )
+    return same_keys and same_options
+
+
+def __index_names(plan: dict) -> List[str]:
+    """Recursively collects index names from the stages of an explain() plan."""
+    names = [plan["indexName"]] if "indexName" in plan else []
+    for stage in [plan.get("inputStage")] + plan.get("inputStages", []):
+        if stage:
+            names.extend(__index_names(stage))
+    return names
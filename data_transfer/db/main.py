@@ -1,22 +1,30 @@
 import logging
 from collections import defaultdict
-from typing import Dict, List
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 
 from data_transfer.config import config
-from data_transfer.schemas.record import Record
-from data_transfer.utils import DeviceType
+from data_transfer.schemas.record import Record, RecordSummary
+from data_transfer.utils import DeviceType, StudySite
 
 client = MongoClient(config.database_uri)
 _db = client[config.database_name]
 
 log = logging.getLogger(__name__)
 
+# Fields loaded for a RecordSummary
+SUMMARY_PROJECTION = {"_id": 1, "patient_id": 1, "device_id": 1}
+
+# Number of candidate hashes sent per query; keeps each $in well within BSON limits
+HASH_BATCH_SIZE = 5000
+
 
 def create_record(record: Record) -> ObjectId:
     result = _db.records.insert_one(record.dict())
+    record.mark_saved()
     log.debug(f"Record Created:\n  {record}")
     return result.inserted_id
 
@@ -27,19 +35,102 @@ def read_record(mongo_id: str) -> Record:
     return Record(**result)
 
 
+def records_by_ids(ids: Iterable[ObjectId]) -> List[Record]:
+    """Records by ID, e.g. those of a group of RecordSummaries."""
+    filters = {"_id": {"$in": [ObjectId(id) for id in ids]}}
+    return __filtered_records(filters)
+
+
 def records_by_dmp_folder(dmp_folder: str) -> List[Record]:
     filters = {"dmp_folder": dmp_folder}
     return __filtered_records(filters)
 
 
 def update_record(record: Record) -> None:
-    _db.records.update_one(
-        {"_id": ObjectId(record.id)}, {"$set": record.dict()}, upsert=False
+    """Sets only the fields of the record that changed since it was loaded."""
+    if changed := record.changed_fields():
+        _db.records.update_one(
+            {"_id": ObjectId(record.id)},
+            {"$set": record.dict(include=changed)},
+            upsert=False,
+        )
+        record.mark_saved()
+
+
+def update_records(
+    records: List[Record], fields: Optional[Iterable[str]] = None
+) -> None:
+    """
+    Sets the given fields (by default, those changed) of each record in a single
+    round trip, e.g., when a stage transition applies to a patient/device group.
+    """
+    fields = set(fields) if fields else None
+    operations = []
+    written = []
+    for record in records:
+        include = fields or record.changed_fields()
+        if include:
+            operations.append(
+                UpdateOne(
+                    {"_id": ObjectId(record.id)},
+                    {"$set": record.dict(include=include)},
+                )
+            )
+            written.append((record, include))
+    if operations:
+        _db.records.bulk_write(operations, ordered=False)
+        log.debug(f"Updated {len(operations)} records")
+    # other changed fields are left to be written by a later update
+    for record, include in written:
+        record.mark_saved(include)
+
+
+def unknown_hashes(hashes: Iterable[str]) -> Set[str]:
+    """
+    Returns the subset of hashes that are not stored in the DB.
+    Membership is resolved by the DB in batches using the unique 'hash' index
+    (see db.indexes) and projecting only the hash, so the cost scales with the
+    candidates rather than the whole collection.
+    """
+    candidates = list(set(hashes))
+    unknown = set(candidates)
+
+    for start in range(0, len(candidates), HASH_BATCH_SIZE):
+        batch = candidates[start : start + HASH_BATCH_SIZE]
+        known = _db.records.find({"hash": {"$in": batch}}, {"hash": 1, "_id": 0})
+        unknown.difference_update(doc["hash"] for doc in known)
+
+    return unknown
+
+
+def read_watermark(
+    device_type: DeviceType, study_site: StudySite
+) -> Optional[datetime]:
+    """
+    When the recording that the next listing of a study site starts from (e.g.
+    the newest listed) started, if the site was listed before.
+    """
+    result = _db.watermarks.find_one({"_id": __watermark_id(device_type, study_site)})
+    return result["start"] if result else None
+
+
+def update_watermark(
+    device_type: DeviceType, study_site: StudySite, record_id: str, start: datetime
+) -> None:
+    """
+    Stores the recording that the next listing of a study site starts from.
+    NOTE: may move back, e.g. to list again records that could not be stored.
+    """
+    _db.watermarks.replace_one(
+        {"_id": __watermark_id(device_type, study_site)},
+        {"record_id": record_id, "start": start},
+        upsert=True,
     )
+    log.debug(f"Watermark of {device_type.name}/{study_site.name}: {start}")
 
 
-def all_hashes() -> List[str]:
-    return [doc["hash"] for doc in _db.records.find()]
+def __watermark_id(device_type: DeviceType, study_site: StudySite) -> str:
+    return f"{device_type.name}/{study_site.name}"
 
 
 def records_not_downloaded(device_type: DeviceType) -> Dict[str, List]:
@@ -54,6 +145,31 @@ def records_not_uploaded(device_type: DeviceType) -> Dict[str, List]:
     return __group_by_composite_key(records)
 
 
+def record_summaries_not_uploaded(
+    device_type: DeviceType,
+) -> Iterator[Tuple[str, List[RecordSummary]]]:
+    """
+    As records_not_uploaded, but only loads what is needed to schedule tasks and
+    yields one patient/device group at a time, so memory is bounded by a group
+    rather than all pending records (e.g. in a historical backfill).
+
+    NOTE: only the group keys are listed upfront; each group is queried when
+    reached, so no cursor is held open while the previous group is processed.
+    """
+    filters = {"is_uploaded": False, "device_type": device_type.name}
+    pipeline = [
+        {"$match": filters},
+        {"$group": {"_id": {"patient_id": "$patient_id", "device_id": "$device_id"}}},
+        {"$sort": {"_id.patient_id": 1, "_id.device_id": 1}},
+    ]
+    groups = [doc["_id"] for doc in _db.records.aggregate(pipeline)]
+
+    for group in groups:
+        # may be empty if uploaded while processing a prior group
+        if records := __filtered_summaries({**filters, **group}):
+            yield f"{group['patient_id']}/{group['device_id']}", records
+
+
 def records_processed_and_not_uploaded(device_type: DeviceType) -> Dict[str, List]:
     filters = {
         "is_uploaded": False,
@@ -67,10 +183,20 @@ def records_processed_and_not_uploaded(device_type: DeviceType) -> Dict[str, Lis
 
 def __filtered_records(filters: dict) -> List[Record]:
     """Returns Records by dict of filters."""
-    return [Record(**doc) for doc in _db.records.find(filters)]
+    return [Record.from_db(doc) for doc in _db.records.find(filters)]
+
 
+def __filtered_summaries(filters: dict) -> List[RecordSummary]:
+    """Returns RecordSummaries by dict of filters, projecting only their fields."""
+    return [
+        RecordSummary(doc["_id"], doc["patient_id"], doc["device_id"])
+        for doc in _db.records.find(filters, SUMMARY_PROJECTION)
+    ]
 
-def __group_by_composite_key(records: List[Record]) -> Dict[str, List]:
+
+def __group_by_composite_key(
+    records: Sequence[Union[Record, RecordSummary]],
+) -> Dict[str, List]:
     """Groups records by a pre-determined key. Could be a componsent"""
     results = defaultdict(list)
     # Transform the result to:
@@ -91,6 +217,11 @@ def min_max_data_wear_times(records: List[Record]) -> tuple:
     return (earliest_start, latest_end)
 
 
-def all_records_downloaded(records: List[Record]) -> bool:
-    """True if all data for each record in parameter was downloaded."""
-    return all([read_record(record.id).is_downloaded for record in records])
+def all_records_downloaded(records: Sequence[Union[Record, RecordSummary]]) -> bool:
+    """
+    True if all data for each record in parameter was downloaded.
+    Checked in one query by counting those in the group not yet downloaded.
+    """
+    ids = [ObjectId(record.id) for record in records]
+    filters = {"_id": {"$in": ids}, "is_downloaded": False}
+    return _db.records.count_documents(filters, limit=1) == 0
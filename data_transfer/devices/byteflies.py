@@ -1,12 +1,13 @@
 import logging
 from dataclasses import dataclass
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
 from typing import Dict, List, Optional
 
 from data_transfer import utils
 from data_transfer.config import config
-from data_transfer.db import all_hashes, create_record, read_record, update_record
+from data_transfer.db import create_record, read_record, unknown_hashes, update_record
 from data_transfer.lib import byteflies as byteflies_api
 from data_transfer.schemas.record import Record
 from data_transfer.services import inventory, ucam
@@ -14,6 +15,9 @@ from data_transfer.utils import StudySite
 
 log = logging.getLogger(__name__)
 
+# Files listed before filtering known records and creating the others
+METADATA_BATCH_SIZE = 100
+
 
 @dataclass
 class BytefliesRecording:
@@ -55,22 +59,6 @@ class Byteflies:
         self.study_site = study_site
         self.device_type = utils.DeviceType.BTF
         self.file_type = ".csv"
-        # timestamp used to optimise lru_cache in file download pipeline
-        self.last_downloaded = 0
-        self.download_cache_expiry = 300  # 5 minutes
-
-    def __get_timestamp(self) -> int:
-        """
-        return a timestamp that changes every x minutes to allow caching of API call
-        # NOTE: only used in the download stage
-        """
-        now = int(datetime.now().timestamp())
-        self.last_downloaded = (
-            now
-            if now - self.last_downloaded > self.download_cache_expiry
-            else self.last_downloaded
-        )
-        return self.last_downloaded
 
     def download_metadata(self, from_date: int, to_date: int) -> None:
         """
@@ -81,103 +69,103 @@ class Byteflies:
         NOTE/TODO: will run as BATCH job.
         """
         # Note: includes metadata for ALL data records, therefore we must filter them
-        all_records = byteflies_api.get_list(
+        # NOTE: files are listed as each recording is fetched, and records created
+        # per batch, so memory does not scale with the period queried.
+        all_records = byteflies_api.iter_list(
             config.byteflies_group_ids[self.study_site],
             from_date,
             to_date,
         )
 
-        log.info(
-            f"Total Byteflies records: {len(all_records)} for {self.study_site.name}"
-        )
+        total, known, unknown = 0, 0, 0
 
-        unknown_records = self.__unknown_records(all_records)
+        while batch := list(islice(all_records, METADATA_BATCH_SIZE)):
+            total += len(batch)
+            for hash_id, item in self.__unknown_records(batch).items():
+                if self.__create_record(hash_id, item):
+                    known += 1
+                else:
+                    unknown += 1
 
-        log.info(f"Total unknown records: {len(unknown_records.keys())}")
+        log.info(f"Total Byteflies records: {total} for {self.study_site.name}")
+        log.info(f"Total unknown records: {known + unknown}")
+        log.debug(f"{known} records created and {unknown} NOT this session.")
 
-        known, unknown = 0, 0
+    def __create_record(self, hash_id: str, item: byteflies_api.RecordingFile) -> bool:
+        """
+        Creates a record for an unknown file if its patient and device are known.
+        """
+        # Pulls out the most relevant metadata for this recording
+        recording = self.recording_metadata(item)
 
-        for hash_id, item in unknown_records.items():
-            # Pulls out the most relevant metadata for this recording
-            recording = self.recording_metadata(item)
+        if not (
+            _device_id := inventory.device_id_by_serial(
+                self.device_type, recording.dot_id
+            )
+        ):
+            log.debug(f"Record NOT created for unknown device\n   {recording}")
+            return False  # Skip record
 
-            if not (
-                _device_id := inventory.device_id_by_serial(
-                    self.device_type, recording.dot_id
-                )
-            ):
-                log.debug(f"Record NOT created for unknown device\n   {recording}")
-                unknown += 1
-                continue  # Skip record
+        if not (device_id := utils.format_id_device(_device_id)):
+            log.error(
+                f"Record NOT created: Error formatting DeviceID ({_device_id}) for\n{recording}\n"
+            )
+            return False
+
+        _patient_id = (
+            # To keep UCAM as the source of truth, we ignore the patient_id in the
+            # BTF payload - though log to debug later on
+            self.__patient_id_from_ucam(device_id, recording.start, recording.end)
+            or self.__patient_id_from_inventory(
+                device_id, recording.start, recording.end
+            )
+        )
 
-            if not (device_id := utils.format_id_device(_device_id)):
+        if not (patient_id := utils.format_id_patient(_patient_id)):
+
+            if api_patient_id := utils.format_id_patient(recording.patient_id):
                 log.error(
-                    f"Record NOT created: Error formatting DeviceID ({_device_id}) for\n{recording}\n"
+                    f"Record NOT created: Error finding provided PatientID ({api_patient_id})"
+                    f"for\n{recording}\n"
                 )
-                unknown += 1
-                continue
-
-            _patient_id = (
-                # To keep UCAM as the source of truth, we ignore the patient_id in the
-                # BTF payload - though log to debug later on
-                self.__patient_id_from_ucam(device_id, recording.start, recording.end)
-                or self.__patient_id_from_inventory(
-                    device_id, recording.start, recording.end
+            else:
+                log.error(
+                    f"Record NOT created: Error formatting PatientID ({_patient_id})"
+                    f"for\n{recording}\n"
                 )
-            )
-
-            if not (patient_id := utils.format_id_patient(_patient_id)):
-
-                if (api_patient_id := utils.format_id_patient(recording.patient_id)) :
-                    log.error(
-                        f"Record NOT created: Error finding provided PatientID ({api_patient_id})"
-                        f"for\n{recording}\n"
-                    )
-                else:
-                    log.error(
-                        f"Record NOT created: Error formatting PatientID ({_patient_id})"
-                        f"for\n{recording}\n"
-                    )
-                unknown += 1
-                continue
-
-            known += 1
-
-            record = Record(
-                # can relate to a single download file or a group of files
-                hash=hash_id,
-                manufacturer_ref=recording.recording_id,
-                device_type=self.device_type.name,
-                device_id=device_id,
-                patient_id=patient_id,
-                start_wear=recording.start,
-                end_wear=recording.end,
-                meta=dict(
-                    studysite_id=recording.group_id,
-                    recording_id=recording.recording_id,
-                    signal_id=recording.signal_id,
-                    algorithm_id=recording.algorithm_id,
-                ),
-            )
-
-            create_record(record)
+            return False
+
+        record = Record(
+            # can relate to a single download file or a group of files
+            hash=hash_id,
+            manufacturer_ref=recording.recording_id,
+            device_type=self.device_type.name,
+            device_id=device_id,
+            patient_id=patient_id,
+            start_wear=recording.start,
+            end_wear=recording.end,
+            meta=dict(
+                studysite_id=recording.group_id,
+                recording_id=recording.recording_id,
+                signal_id=recording.signal_id,
+                algorithm_id=recording.algorithm_id,
+            ),
+        )
 
-            del item["IDEAFAST"]  # remove record-specific temporary metadata
-            utils.write_json(record.metadata_path(), item)
+        create_record(record)
 
-        log.debug(f"{known} records created and {unknown} NOT this session.")
+        utils.write_json(record.metadata_path(), dict(item.recording))
+        return True
 
-    def __unknown_records(self, records: List[dict]) -> Dict[str, dict]:
+    def __unknown_records(
+        self, records: List[byteflies_api.RecordingFile]
+    ) -> Dict[str, byteflies_api.RecordingFile]:
         """
         Only add records that are not known in the DB, i.e., ID and filename.
         """
-        results = {}
-        known_records = all_hashes()
-        for record in records:
-            record_hash = record["IDEAFAST"]["hash"]
-            if record_hash not in known_records:
-                results[record_hash] = record
-        return results
+        results = {record.hash: record for record in records}
+        unknown = unknown_hashes(results.keys())
+        return {k: v for k, v in results.items() if k in unknown}
 
     def download_file(self, mongo_id: str) -> None:
         """
@@ -200,7 +188,6 @@ class Byteflies:
             record.meta["recording_id"],
             record.meta["signal_id"],
             record.meta["algorithm_id"],
-            self.__get_timestamp(),
         )
 
         # filename if succes, None if not
@@ -209,7 +196,8 @@ class Byteflies:
             downloaded_file = Path(
                 record.download_folder() / f"{filename}{self.file_type}"
             )
-            record.meta["filesize"] = downloaded_file.stat().st_size
+            filesize = downloaded_file.stat().st_size
+            record.meta = {**record.meta, "filesize": filesize}
 
             record.is_downloaded = True
             update_record(record)
@@ -217,28 +205,23 @@ class Byteflies:
         else:
             log.debug(f"Download FAILED for:\n   {record}")
 
-    def recording_metadata(self, recording: dict) -> BytefliesRecording:
+    def recording_metadata(
+        self, item: byteflies_api.RecordingFile
+    ) -> BytefliesRecording:
         """
         Maps data from ByteFlies response to class to simplify access/logging.
         """
+        recording = item.recording
         start_recording = utils.format_weartime_from_timestamp(recording["startDate"])
         end_recording = utils.get_endwear_by_seconds(
             start_recording, recording["duration"]
         )
         signal: dict = next(
-            (
-                s
-                for s in recording["signals"]
-                if s["id"] == recording["IDEAFAST"]["signal_id"]
-            ),
+            (s for s in recording["signals"] if s["id"] == item.signal_id),
             None,
         )
         algorithm_id: str = next(
-            (
-                a["id"]
-                for a in signal["algorithms"]
-                if a["id"] == recording["IDEAFAST"]["algorithm_id"]
-            ),
+            (a["id"] for a in signal["algorithms"] if a["id"] == item.algorithm_id),
             None,
         )
 
@@ -270,4 +253,4 @@ class Byteflies:
         Determine PatientID by wear period in inventory.
         """
         record = inventory.record_by_device_id(device_id, start, end)
-        return record.get("patient_id", None) if record else None
+        return record.patient_id if record else None
@@ -1,6 +1,6 @@
 import logging
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
@@ -8,7 +8,14 @@ import requests
 
 from data_transfer import utils
 from data_transfer.config import config
-from data_transfer.db import all_hashes, create_record, read_record, update_record
+from data_transfer.db import (
+    create_record,
+    read_record,
+    read_watermark,
+    unknown_hashes,
+    update_record,
+    update_watermark,
+)
 from data_transfer.lib import dreem as dreem_api
 from data_transfer.schemas.record import Record
 from data_transfer.services import inventory, ucam
@@ -50,7 +57,7 @@ class Dreem:
         log.info(f"Authentication successful: {user_id}")
         return user_id, session
 
-    def download_metadata(self) -> None:
+    def download_metadata(self, full: bool = False) -> None:
         """
         Before downloading raw data we need to know which files to download.
         Dreem provided a range of metadata (including a report) per data record.
@@ -58,10 +65,15 @@ class Dreem:
         This method downloads and stores the metadata as file, and stores most
         relevant metadata as a Record in the database in preparation for next stages.
 
+        Only records since the site's watermark (less an overlap) are requested,
+        unless full, e.g. to retry records skipped for an unknown device.
+
         NOTE/TODO: will run as BATCH job.
         """
-        # Note: includes metadata for ALL data records, therefore we must filter them
-        all_records = dreem_api.get_restricted_list(self.session, self.user_id)
+        since = None if full else self.__listing_since()
+
+        # Note: includes metadata for known data records, therefore we must filter them
+        all_records = dreem_api.get_restricted_list(self.session, self.user_id, since)
 
         log.info(f"Total dreem records: {len(all_records)} for {self.study_site.name}")
 
@@ -70,6 +82,8 @@ class Dreem:
         log.info(f"Total unknown records: {len(unknown_records.keys())}")
 
         known, unknown = 0, 0
+        # not stored, so the watermark must not pass them (see __update_watermark)
+        skipped: List[Dict] = []
 
         for hash_id, item in unknown_records.items():
             if not item.get("report") and not item.get("h5file").get("available"):
@@ -85,6 +99,7 @@ class Dreem:
             if not device_serial:
                 log.debug(f"Record NOT created for unknown device\n   {recording}")
                 unknown += 1
+                skipped.append(item)
                 continue  # Skip record
 
             _device_id = inventory.device_id_by_serial(self.device_type, device_serial)
@@ -94,6 +109,7 @@ class Dreem:
                     f"Record NOT created: Error formatting DeviceID ({_device_id}) for\n{recording}\n"
                 )
                 unknown += 1
+                skipped.append(item)
                 continue
 
             _patient_id = (
@@ -112,6 +128,7 @@ class Dreem:
                     f"Record NOT created: Error formatting PatientID ({_patient_id}) for\n{recording}\n"
                 )
                 unknown += 1
+                skipped.append(item)
                 continue
 
             known += 1
@@ -133,17 +150,60 @@ class Dreem:
 
         log.debug(f"{known} records created and {unknown} NOT this session.")
 
+        self.__update_watermark(all_records, skipped)
+
+    def __listing_since(self) -> Optional[datetime]:
+        """
+        When to list records from: the newest listed recording less an overlap,
+        or None to list all records if the site was not listed before.
+        """
+        watermark = read_watermark(self.device_type, self.study_site)
+        if not watermark:
+            return None
+        return watermark - timedelta(days=config.dreem_listing_overlap_days)
+
+    def __update_watermark(self, records: List[Dict], skipped: List[Dict]) -> None:
+        """
+        Stores the newest recording listed, once all records listed were handled.
+        If records were skipped (e.g. for an unknown device), stores the oldest of
+        those instead, so they are listed (and tried) again by the next batch.
+        Records skipped for longer than config.dreem_skipped_retry_days (before
+        the newest listed) are moved past, as some are never resolved (e.g. gmail
+        users), and are only tried again by a full listing.
+
+        NOTE: records without a report have no start time, so are not considered;
+        once reported, they are listed again if within the listing overlap.
+        """
+        reported = [r for r in records if r.get("report")]
+        if not reported:
+            return
+        newest = max(reported, key=lambda r: r["report"]["start_time"])
+        retry_days = timedelta(days=config.dreem_skipped_retry_days)
+        retry_since = newest["report"]["start_time"] - retry_days.total_seconds()
+
+        retried = []
+        for record in skipped:
+            if not record.get("report"):
+                continue
+            if record["report"]["start_time"] >= retry_since:
+                retried.append(record)
+            else:
+                log.warning(
+                    f"Record {record['id']} skipped for {retry_days.days}+ days: "
+                    "moved past, so only a full listing tries it again"
+                )
+
+        mark = min(retried, key=lambda r: r["report"]["start_time"], default=newest)
+        start = datetime.fromtimestamp(mark["report"]["start_time"])
+        update_watermark(self.device_type, self.study_site, mark["id"], start)
+
     def __unknown_records(self, records: List[Dict]) -> Dict[str, Dict]:
         """
         Only add records that are not known in the DB, i.e., ID and filename.
         """
-        results = {}
-        known_records = all_hashes()
-        for record in records:
-            record_hash = uid_to_hash(record["id"], self.device_type)
-            if record_hash not in known_records:
-                results[record_hash] = record
-        return results
+        results = {uid_to_hash(r["id"], self.device_type): r for r in records}
+        unknown = unknown_hashes(results.keys())
+        return {k: v for k, v in results.items() if k in unknown}
 
     def __recording_metadata(self, recording: dict) -> DreemRecording:
         """
@@ -176,7 +236,7 @@ class Dreem:
         Determine PatientID by wear period in inventory.
         """
         record = inventory.record_by_device_id(device_id, start, end)
-        return record.get("patient_id", None) if record else None
+        return record.patient_id if record else None
 
     def download_file(self, mongo_id: str) -> None:
         """
@@ -202,7 +262,8 @@ class Dreem:
             downloaded_file = Path(
                 record.download_folder() / f"{record.manufacturer_ref}.h5"
             )
-            record.meta["filesize"] = downloaded_file.stat().st_size
+            filesize = downloaded_file.stat().st_size
+            record.meta = {**record.meta, "filesize": filesize}
 
             record.is_downloaded = is_downloaded_success
             update_record(record)
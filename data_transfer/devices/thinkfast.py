@@ -11,7 +11,7 @@ from dataclasses import dataclass
 from typing import Dict, List
 
 from data_transfer import utils
-from data_transfer.db import all_hashes, create_record
+from data_transfer.db import create_record, unknown_hashes
 from data_transfer.lib import thinkfast as thinkfast_api
 from data_transfer.schemas.record import Record
 from data_transfer.utils import StudySite, uid_to_hash
@@ -42,13 +42,11 @@ class ThinkFast:
         """
         Only add records that are not known in the DB, i.e., ID and filename.
         """
-        results = {}
-        known_records = all_hashes()
-        for record in records:
-            record_hash = uid_to_hash(record.manufacturer_ref, self.device_type)
-            if record_hash not in known_records:
-                results[record_hash] = record
-        return results
+        results = {
+            uid_to_hash(r.manufacturer_ref, self.device_type): r for r in records
+        }
+        unknown = unknown_hashes(results.keys())
+        return {k: v for k, v in results.items() if k in unknown}
 
     def format_record(self, raw_rec: Dict, participant: Participant) -> Record:
         """
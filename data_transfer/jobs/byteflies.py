@@ -1,8 +1,10 @@
 from data_transfer.devices.byteflies import Byteflies
+from data_transfer.services import ucam
 
 
 def batch_metadata(byteflies: Byteflies, from_date: int, to_date: int) -> None:
     """
     This method stores the records we have not yet processed.
     """
-    byteflies.download_metadata(from_date, to_date)
+    with ucam.snapshot_mode():
+        byteflies.download_metadata(from_date, to_date)
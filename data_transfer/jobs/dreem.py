@@ -1,7 +1,8 @@
 from data_transfer.devices.dreem import Dreem
+from data_transfer.services import ucam
 
 
-def batch_metadata(dreem: Dreem) -> None:
+def batch_metadata(dreem: Dreem, full: bool = False) -> None:
     """
     Dreem's API offers a single request that returns all known data records per study site.
 
@@ -9,5 +10,8 @@ def batch_metadata(dreem: Dreem) -> None:
 
     NOTE/TODO: this cron batch should be run daily at lunchtime:
         i.e. when most patients have finished sleep.
+
+    If full, all records are listed rather than those since the last batch.
     """
-    dreem.download_metadata()
+    with ucam.snapshot_mode():
+        dreem.download_metadata(full)
@@ -1,13 +1,15 @@
 import logging
 from pathlib import Path
+from typing import Sequence
 
 from data_transfer.config import config
 from data_transfer.db import (
     min_max_data_wear_times,
     records_by_dmp_folder,
-    records_not_uploaded,
-    update_record,
+    records_by_ids,
+    update_records,
 )
+from data_transfer.schemas.record import RecordSummary
 from data_transfer.services import dmpy
 from data_transfer.utils import DeviceType
 
@@ -43,62 +45,66 @@ def upload_data(data_folder: Path) -> None:
     """Zips and uploads a folder at data_folder."""
     log.debug(f"Uploading: {data_folder}")
 
-    zip_path = dmpy.zip_folder(data_folder)
-    is_uploaded = dmpy.upload(zip_path)
+    zip_path, checksum = dmpy.zip_folder_with_checksum(data_folder)
+    is_uploaded = dmpy.upload(zip_path, checksum)
 
     if is_uploaded:
-        for record in records_by_dmp_folder(data_folder.stem):
+        records = records_by_dmp_folder(data_folder.stem)
+        for record in records:
             record.is_uploaded = True
-            update_record(record)
+        update_records(records)
 
         dmpy.rm_local_data(zip_path)
 
 
-def prepare_data_folders(device_type: DeviceType) -> None:
+def prepare_data_folders(
+    device_type: DeviceType, records: Sequence[RecordSummary]
+) -> None:
     """
-    Checks folders present in 'data/upload/ are finished
-    and moves them into the upload folder in the format:
+    Checks the folder of one group of records (i.e. a patient/device, as
+    streamed by db.record_summaries_not_uploaded) is finished and moves it
+    into the upload folder in the format:
 
         DEVICEID-PATIENTID-STARTWEAR-ENDWEAR
     """
-    grouped = records_not_uploaded(device_type)
+    if not records:
+        return
+
+    # NOTE: only this group's records are loaded, not all records not uploaded
+    group = records_by_ids(record.id for record in records)
 
-    # filter sets which have any record with 'is_processed' == False
     # 'is_processed' == False catches the 'False' for any preceding task as well
-    to_upload = {k: v for k, v in grouped.items() if all([r.is_processed for r in v])}
+    if not all(record.is_processed for record in group):
+        return
 
-    for patient_device in to_upload.keys():
-        max_data, min_data = min_max_data_wear_times(to_upload[patient_device])
+    patient_device = f"{records[0].patient_id}/{records[0].device_id}"
+    max_data, min_data = min_max_data_wear_times(group)
 
-        start_data = max_data.strftime("%Y%m%d")
-        end_data = min_data.strftime("%Y%m%d")
+    start_data = max_data.strftime("%Y%m%d")
+    end_data = min_data.strftime("%Y%m%d")
 
-        source = config.storage_vol / device_type.name / patient_device
+    source = config.storage_vol / device_type.name / patient_device
 
-        dmp_folder = (
-            f"{patient_device.replace('-','').replace('/','-')}-{start_data}-{end_data}"
-        )
+    dmp_folder = (
+        f"{patient_device.replace('-','').replace('/','-')}-{start_data}-{end_data}"
+    )
 
-        # patient_device looks like = 'patient-id/device-id'
-        destination = config.upload_folder / device_type.name / dmp_folder
+    # patient_device looks like = 'patient-id/device-id'
+    destination = config.upload_folder / device_type.name / dmp_folder
 
-        destination.mkdir(parents=True, exist_ok=True)
+    destination.mkdir(parents=True, exist_ok=True)
 
-        source.rename(destination)
+    source.rename(destination)
 
-        for record in to_upload[patient_device]:
-            record.is_prepared = True
-            record.dmp_folder = dmp_folder
-            update_record(record)
+    for record in group:
+        record.is_prepared = True
+        record.dmp_folder = dmp_folder
+    update_records(group)
 
-        # check if patient folder is empty, then remove it
-        patient_path = (
-            config.storage_vol
-            / device_type.name
-            / to_upload[patient_device][0].patient_id
-        )
+    # check if patient folder is empty, then remove it
+    patient_path = config.storage_vol / device_type.name / records[0].patient_id
 
-        if not any(patient_path.iterdir()):
-            patient_path.rmdir()
-        else:
-            log.error("Files left behind when uploading dataset to DMP.")
+    if not any(patient_path.iterdir()):
+        patient_path.rmdir()
+    else:
+        log.error("Files left behind when uploading dataset to DMP.")
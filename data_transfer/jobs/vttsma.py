@@ -1,4 +1,5 @@
 from data_transfer.devices.vttsma import Vttsma
+from data_transfer.services import ucam
 
 
 def batch_metadata() -> None:
@@ -10,4 +11,5 @@ def batch_metadata() -> None:
     NOTE/TODO: this cron batch should be run weekly to accomodate the weekly VTT S3 export
     """
     vttsma = Vttsma()
-    vttsma.download_metadata()
+    with ucam.snapshot_mode():
+        vttsma.download_metadata()
@@ -1,110 +1,160 @@
-import json
 import logging
 import os
+import threading
 import time
 from dataclasses import dataclass
-from datetime import datetime
-from functools import lru_cache
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Any, List, Optional
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
 import requests
 
 from data_transfer.config import config
-from data_transfer.utils import DeviceType, uid_to_hash
+from data_transfer.utils import DeviceType, http, uid_to_hash
+from data_transfer.utils.concurrency import RateLimiter, iter_concurrently
 
 log = logging.getLogger(__name__)
 
+# Keeps connections alive between the many requests to the API and to AWS
+session = http.build_session(config.http_pool_size, config.http_retries)
 
-def btf_access_token(forced: bool = False) -> str:
-    """Obtain (or refresh) an access token. Can be forced (in case of 401 HTTP error)"""
+# ByteFlies DEV: when too many requests, it throws 429 or 502
+# Shared by all requests (and threads) to run at the allowed rate, which adapts
+# when throttled; throttled requests are retried up to MAX_RETRIES times.
+rate_limiter = RateLimiter(config.byteflies_requests_per_second)
+THROTTLED_STATUS_CODES = [429, 502]
+MAX_RETRIES = 5
 
-    now = int(datetime.utcnow().timestamp())
-    last_created = int(os.getenv("BTF_ACCESS_TOKEN_GEN_TIME", 0))
+# Shared by all threads; held while the access token is checked and refreshed
+token_lock = threading.Lock()
 
-    # Refresh the token every 50 minutes  i.e., below 60 minute limit.
-    token_expired = (last_created + (60 * 50)) <= now
+# Recording details by recording ID, shared by all its signals and algorithms,
+# as (expiry, details): valid while the pre-signed rawData URLs within are.
+recording_cache: Dict[str, Tuple[float, dict]] = {}
+recording_cache_lock = threading.Lock()
+# Seconds to cache details if their URLs do not state when they expire
+RECORDING_CACHE_SECONDS = 300
+# Details cached at most, evicting the oldest, e.g. when backfilling many
+# recordings that are listed but never downloaded before their URLs expire
+RECORDING_CACHE_SIZE = 1024
+# Seconds before URLs expire to renew details, so downloads can complete
+URL_EXPIRY_MARGIN = 60
 
-    if token_expired or forced:
-        try:
-            username = config.byteflies_username
-            password = config.byteflies_password
-            client_id = config.byteflies_aws_client_id
-
-            res = requests.post(
-                f"{config.byteflies_aws_auth_url}",
-                headers={
-                    "X-Amz-Target": "AWSCognitoIdentityProviderService.InitiateAuth",
-                    "Content-Type": "application/x-amz-json-1.1",
-                },
-                json={
-                    "ClientId": f"{client_id}",
-                    "AuthFlow": "USER_PASSWORD_AUTH",
-                    "AuthParameters": {
-                        "USERNAME": f"{username}",
-                        "PASSWORD": f"{password}",
+
+def btf_access_token(forced: bool = False) -> str:
+    """Obtain (or refresh) an access token. Can be forced (in case of 401 HTTP error)"""
+    # NOTE: locked, as concurrent requests would otherwise each refresh the token
+    with token_lock:
+        now = int(datetime.utcnow().timestamp())
+        last_created = int(os.getenv("BTF_ACCESS_TOKEN_GEN_TIME", 0))
+
+        # Refresh the token every 50 minutes  i.e., below 60 minute limit.
+        token_expired = (last_created + (60 * 50)) <= now
+
+        if token_expired or forced:
+            try:
+                username = config.byteflies_username
+                password = config.byteflies_password
+                client_id = config.byteflies_aws_client_id
+
+                res = session.post(
+                    f"{config.byteflies_aws_auth_url}",
+                    headers={
+                        "X-Amz-Target": "AWSCognitoIdentityProviderService.InitiateAuth",
+                        "Content-Type": "application/x-amz-json-1.1",
                     },
-                },
-            )
+                    json={
+                        "ClientId": f"{client_id}",
+                        "AuthFlow": "USER_PASSWORD_AUTH",
+                        "AuthParameters": {
+                            "USERNAME": f"{username}",
+                            "PASSWORD": f"{password}",
+                        },
+                    },
+                )
 
-            res.raise_for_status()
-            log.info("Authentication successful")
-            resp = res.json()
-            access_token = str(resp["AuthenticationResult"]["IdToken"])
+                res.raise_for_status()
+                log.info("Authentication successful")
+                resp = res.json()
+                access_token = str(resp["AuthenticationResult"]["IdToken"])
 
-            os.environ["BTF_ACCESS_TOKEN"] = access_token
-            os.environ["BTF_ACCESS_TOKEN_GEN_TIME"] = str(now)
+                os.environ["BTF_ACCESS_TOKEN"] = access_token
+                os.environ["BTF_ACCESS_TOKEN_GEN_TIME"] = str(now)
 
-        except Exception:
-            log.error("Exception:", exc_info=True)
+            except Exception:
+                log.error("Exception:", exc_info=True)
 
-    return os.getenv("BTF_ACCESS_TOKEN")
+        return os.getenv("BTF_ACCESS_TOKEN")
 
 
-def get_list(studysite_id: str, from_date: int, to_date: int) -> List[dict]:
+@dataclass
+class RecordingFile:
     """
-    GET a list of records (metadata) across study sites, or 'groups' in ByteFlies API
+    One file to download from a Recording, i.e. a signal or algorithm of it.
+    Files share their (read-only) recording payload rather than copying it.
     """
 
-    @dataclass
-    class __metadata_copy:
-        """Generator for deepcopying a BTF json object"""
+    # reduces memory by locking the number of fields
+    __slots__ = ["recording", "hash", "signal_id", "algorithm_id"]
+
+    recording: Mapping[str, Any]
+    hash: str
+    signal_id: str
+    algorithm_id: str
 
-        jsondump: str
+    @classmethod
+    def from_recording(
+        cls, recording: Mapping[str, Any], signal_id: str, algorithm_id: str = ""
+    ) -> "RecordingFile":
+        uid = f"{recording['id']}/{signal_id}/{algorithm_id}"
+        return cls(recording, uid_to_hash(uid, DeviceType.BTF), signal_id, algorithm_id)
 
-        def get(self, signal_id: str, algorithm_id: str = "") -> Any:
-            copy = json.loads(self.jsondump)
-            # injecting data to copy with duplicates all based on one recording
-            copy["IDEAFAST"] = {
-                "hash": uid_to_hash(
-                    f"{copy['id']}/{signal_id}/{algorithm_id}", DeviceType.BTF
-                ),
-                "signal_id": signal_id,
-                "algorithm_id": algorithm_id,
-            }
-            return copy
 
-    results: List[dict] = []
+def get_list(studysite_id: str, from_date: int, to_date: int) -> List[RecordingFile]:
+    """
+    GET a list of records (metadata) across study sites, or 'groups' in ByteFlies API
+    """
+    return list(iter_list(studysite_id, from_date, to_date))
 
+
+def iter_list(
+    studysite_id: str, from_date: int, to_date: int
+) -> Iterator[RecordingFile]:
+    """
+    As get_list, but yields the files of each recording as its details are fetched
+    """
     recordings: dict = __get_recordings_by_group(studysite_id, from_date, to_date)
 
     # query each recording to retrieve total number of files to download
-    # this will be done again in download file to get a temporary download link
-    for recording in recordings:
+    # details are cached, so download_file reuses their temporary download links
+    def recording_files(recording: dict) -> List[RecordingFile]:
         recording_details: dict = __get_recording_by_id(studysite_id, recording["id"])
 
-        for signal in recording_details["signals"]:
-            del signal["rawData"]
-
-        template = __metadata_copy(json.dumps(recording_details))
+        # NOTE: copied as not to modify the cached details
+        signals = [
+            {key: value for key, value in signal.items() if key != "rawData"}
+            for signal in recording_details["signals"]
+        ]
+        payload = MappingProxyType({**recording_details, "signals": signals})
 
-        for signal in recording_details["signals"]:
-            results.append(template.get(signal["id"]))
+        files = []
+        for signal in signals:
+            files.append(RecordingFile.from_recording(payload, signal["id"]))
 
             for algorithm in signal["algorithms"]:
-                results.append(template.get(signal["id"], algorithm["id"]))
+                files.append(
+                    RecordingFile.from_recording(payload, signal["id"], algorithm["id"])
+                )
+        return files
 
-    return results
+    # Recordings are queried concurrently; requests are rate limited in __get_response
+    for files in iter_concurrently(
+        recording_files, recordings, config.byteflies_max_requests
+    ):
+        yield from files
 
 
 def download_file(
@@ -113,13 +163,12 @@ def download_file(
     recording_id: str,
     signal_id: str,
     algorithm_id: str,
-    timestamp: int,
 ) -> Optional[str]:
     """
     Download all files associated with one ByteFlies recording.
     """
     try:
-        details: dict = __get_recording_by_id(studysite_id, recording_id, timestamp)
+        details: dict = __get_recording_by_id(studysite_id, recording_id)
         signal: dict = next(
             (s for s in details["signals"] if s["id"] == signal_id), None
         )
@@ -142,26 +191,50 @@ def download_file(
 
 def __get_response(url: str) -> Any:
     """
-    Wrapper method to execute a GET request. Gives a second
-    break to avoid 429 / 502 TooManyRequests (as advised)
+    Wrapper method to execute a GET request. Requests are rate limited
+    to avoid 429 / 502 TooManyRequests, and retried when these occur.
     """
-    # ByteFlies DEV: when too many requests, it throws 429 or 502
-    #    If ~once per second, should not be a problem
-    time.sleep(0.5)
-    try:
-        headers = {"Authorization": f"{btf_access_token()}"}
-        response = requests.get(url, headers=headers)
-        log.info(f"Response from {url} was:\n    {response.headers}")
-        response.raise_for_status()
+    for _ in range(MAX_RETRIES):
+        rate_limiter.acquire()
+        try:
+            headers = {"Authorization": f"{btf_access_token()}"}
+            response = session.get(url, headers=headers)
+            log.info(f"Response from {url} was:\n    {response.headers}")
 
-        result: dict = response.json()
+            if response.status_code in THROTTLED_STATUS_CODES:
+                log.warning(f"Throttled ({response.status_code}) by {url}")
+                rate_limiter.throttled(__retry_after(response))
+                continue
 
-        return result
-    except requests.HTTPError:
-        # TODO: catch 401 and auth with force
-        # TODO: catch 429 and 502 and time.sleep and retry
-        log.error(f"GET Exception to {url} ", exc_info=True)
-        return False
+            response.raise_for_status()
+            rate_limiter.succeeded()
+
+            result: dict = response.json()
+
+            return result
+        except requests.HTTPError:
+            # TODO: catch 401 and auth with force
+            log.error(f"GET Exception to {url} ", exc_info=True)
+            return False
+
+    log.error(f"GET to {url} was throttled {MAX_RETRIES} times")
+    return False
+
+
+def __retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds to wait as per the Retry-After header (in seconds or as a date)."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return None
 
 
 def __get_groups() -> List[str]:
@@ -182,18 +255,56 @@ def __get_recordings_by_group(studysite_id: str, begin_date: int, end_date: int)
     )
 
 
-@lru_cache(maxsize=1)
-def __get_recording_by_id(
-    studysite_id: str, recording_id: str, timestamp: int = 0
-) -> Any:
+def __get_recording_by_id(studysite_id: str, recording_id: str) -> Any:
     """
     Returns the details of a particular Recording
-    NOTE: cached (max 1 at a time); used in the download stage.
-    NOTE: The timestamp (see devices/btf) ensures it is refreshed every X seconds
+    NOTE: cached in recording_cache until its rawData URLs are about to expire
+    (up to RECORDING_CACHE_SIZE), so details are fetched once for the metadata
+    and download stages.
     """
-    return __get_response(
+    now = time.time()
+    with recording_cache_lock:
+        expiry, details = recording_cache.get(recording_id, (0, None))
+    if details and now < expiry:
+        return details
+
+    details = __get_response(
         f"{config.byteflies_api_url}/groups/{studysite_id}/recordings/{recording_id}/",
     )
+    if details:
+        with recording_cache_lock:
+            expired = [k for k, (expiry, _) in recording_cache.items() if expiry <= now]
+            for key in expired:
+                del recording_cache[key]
+            recording_cache[recording_id] = (__details_expiry(details, now), details)
+            # NOTE: dicts keep insertion order, so the first was cached first
+            while len(recording_cache) > RECORDING_CACHE_SIZE:
+                del recording_cache[next(iter(recording_cache))]
+    return details
+
+
+def __details_expiry(details: dict, now: float) -> float:
+    """Time (since epoch) until the details of a Recording can be reused."""
+    expiries = [__url_expiry(s.get("rawData", "")) for s in details["signals"]]
+    known = [expiry for expiry in expiries if expiry is not None]
+    if not known:
+        return now + RECORDING_CACHE_SECONDS
+    return min(known) - URL_EXPIRY_MARGIN
+
+
+def __url_expiry(url: str) -> Optional[float]:
+    """Time (since epoch) a pre-signed AWS URL expires (SigV4 or SigV2), if known."""
+    query = parse_qs(urlparse(url).query)
+    try:
+        if "X-Amz-Date" in query and "X-Amz-Expires" in query:
+            signed = datetime.strptime(query["X-Amz-Date"][0], "%Y%m%dT%H%M%SZ")
+            signed = signed.replace(tzinfo=timezone.utc)
+            return signed.timestamp() + int(query["X-Amz-Expires"][0])
+        if "Expires" in query:
+            return float(query["Expires"][0])
+    except ValueError:
+        log.warning(f"Unknown expiry of URL: {url}")
+    return None
 
 
 def __get_algorithm_uri_by_id(
@@ -215,16 +326,7 @@ def __download_file(download_folder: Path, url: str, filename: str) -> bool:
     """
     try:
         path = download_folder / f"{filename}.csv"
-
-        with requests.get(url, stream=True) as response:
-            log.debug(f"Headers from {url} was:\n    {response.headers}")
-
-            response.raise_for_status()
-
-            with open(path, "wb") as output_file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        output_file.write(chunk)
+        http.download(session, url, path, config.download_buffer_size)
         return True
     except Exception:
         log.error("Exception:", exc_info=True)
@@ -6,16 +6,21 @@
 # endpoint rather than pull from a CSV file.
 
 import logging
+from datetime import datetime
 from pathlib import Path
 from typing import List, Optional, Tuple
 
 import requests
 
 from data_transfer.config import config
-from data_transfer.utils import read_csv_from_cache
+from data_transfer.utils import http, mappings
 
 log = logging.getLogger(__name__)
 
+# Unauthenticated requests, i.e. to login and to download files from AWS,
+# which rejects presigned URLs that also have an Authorization header.
+session = http.build_session(config.http_pool_size, config.http_retries)
+
 
 def get_token(creds: dict) -> Tuple[str, str]:
     """
@@ -23,7 +28,7 @@ def get_token(creds: dict) -> Tuple[str, str]:
     """
     url = f"{config.dreem_login_url}/token/"
     try:
-        res = requests.post(url, auth=creds)
+        res = session.post(url, auth=creds)
         res.raise_for_status()
         resp = res.json()
         return (resp["token"], resp["user_id"])
@@ -35,19 +40,29 @@ def get_token(creds: dict) -> Tuple[str, str]:
 
 def get_session(token: str) -> requests.Session:
     """
-    Builds a requests session object with the required header
+    Builds a pooled requests session object with the required header
     """
-    session = requests.Session()
-    session.headers.update({"Authorization": f"Bearer {token}"})
-    return session
+    auth_session = http.build_session(config.http_pool_size, config.http_retries)
+    auth_session.headers.update({"Authorization": f"Bearer {token}"})
+    return auth_session
 
 
-def get_restricted_list(session: requests.Session, user_id: str) -> List[dict]:
+def get_restricted_list(
+    session: requests.Session, user_id: str, since: Optional[datetime] = None
+) -> List[dict]:
     """
     GET all records (metadata) associated with a restricted account (e.g. study site)
+
+    If since is given, only records started since then (or not yet reported) are
+    returned, and paging stops once two consecutive pages only list records that
+    started before then. This relies on the listing being ordered newest record
+    first: if a later page lists newer records, the order is not as expected, so
+    all pages are requested and all records returned.
     """
     url = f"{config.dreem_api_url}/dreem/algorythm/restricted_list/{user_id}/record/"
     results = []
+    # a page of only older records was seen, i.e. the next page is checked
+    older_page = False
 
     while url:
         try:
@@ -56,13 +71,36 @@ def get_restricted_list(session: requests.Session, user_id: str) -> List[dict]:
             result: dict = response.json()
             url = result["next"]
             results.extend(result["results"])
+            if since and __all_started_before(result["results"], since):
+                if older_page:
+                    log.debug(f"Stopped listing at records before {since}")
+                    break
+                older_page = True
+            elif since and older_page:
+                log.warning("Dreem listing is not newest first: listing all records")
+                since = None
         except requests.HTTPError:
             # attempt to skip this one record
             log.error(f"GET Exception to ({url}):", exc_info=True)
             url = result["next"]
+
+    if since:
+        results = [r for r in results if not __all_started_before([r], since)]
     return results
 
 
+def __all_started_before(records: List[dict], since: datetime) -> bool:
+    """
+    True if all records started before since. Records without a report (i.e. not
+    yet processed by Dreem) have no start time, so are treated as new.
+    """
+    timestamp = since.timestamp()
+    return bool(records) and all(
+        record.get("report") and record["report"]["start_time"] < timestamp
+        for record in records
+    )
+
+
 def download_file(
     session: requests.Session, download_path: Path, record_id: str
 ) -> bool:
@@ -121,11 +159,7 @@ def __key_by_value(filename: Path, needle: str) -> Optional[str]:
     """
     Helper method to find key in CSV by value (needle)
     """
-    data = read_csv_from_cache(filename)
-    for item in data:
-        if needle == item["hash"]:
-            return str(item["value"])
-    return None
+    return mappings.value_by_key(filename, needle, "hash", "value")
 
 
 def __download_file(url: str, download_path: Path, record_id: str) -> bool:
@@ -138,18 +172,8 @@ def __download_file(url: str, download_path: Path, record_id: str) -> bool:
         record_id: what to name the record.
     """
     try:
-
         file_path = download_path / f"{record_id}.h5"
-
-        with requests.get(url, stream=True) as response:
-            log.debug(response.headers)
-
-            response.raise_for_status()
-
-            with open(file_path, "wb") as output_file:
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        output_file.write(chunk)
+        http.download(session, url, file_path, config.download_buffer_size)
         return True
     except Exception:
         log.error("Exception:", exc_info=True)
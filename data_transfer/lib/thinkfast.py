@@ -1,4 +1,3 @@
-import csv
 import json
 import logging
 from dataclasses import dataclass
@@ -7,10 +6,12 @@ from typing import Any, Dict, List, Optional
 import requests
 
 from data_transfer.config import config
-from data_transfer.utils import format_id_patient
+from data_transfer.utils import format_id_patient, http, mappings
 
 log = logging.getLogger(__name__)
 
+session = http.build_session(config.http_pool_size, config.http_retries)
+
 
 @dataclass
 class Participant:
@@ -29,7 +30,7 @@ def get_participants_records(user_id: str) -> List[dict]:
     results = []
     while True:
         try:
-            response = requests.get(
+            response = session.get(
                 f"{config.thinkfast_api_url}/visit",
                 params=parameters,
                 headers=headers_dict,
@@ -53,23 +54,14 @@ def id_in_whitelist(input_ID: str) -> Optional[str]:
     """
     correct known incorrect participant IDs
     """
-    # known_incorrect_ids: Dict[str, str] = {}
-
-    # load the csv containing the incorrect IDs and corrections
-    with open(config.tfa_id_corrections, mode="r") as infile:
-        reader = csv.reader(infile)
-        # skip first line
-        next(reader)
-        known_incorrect_ids = {rows[0]: rows[1] for rows in reader}
+    # the csv of incorrect IDs (first column) and corrections (second column)
+    output_ID = mappings.value_by_key(config.tfa_id_corrections, input_ID)
 
-    if input_ID in known_incorrect_ids:
-        output_ID = known_incorrect_ids[input_ID]
+    if output_ID is not None:
         log.warning(
             f"CORRECTED AN ERROR USING THE known_incorrect_ids DICT: "
             f"INPUT {input_ID}, OUTPUT: {output_ID}"
         )
-    else:
-        output_ID = None
     return output_ID
 
 
@@ -98,7 +90,7 @@ def get_participants() -> List[Participant]:
     while True:
         # make API call
         try:
-            response = requests.get(
+            response = session.get(
                 f"{config.thinkfast_api_url}/subject",
                 headers=headers_dict,
                 params=parameters,
@@ -3,7 +3,8 @@ from logging.config import fileConfig
 
 from data_transfer.config import config
 from data_transfer.dags import btf, drm, sma, tfa
-from data_transfer.utils import DeviceType, StudySite
+from data_transfer.db import indexes
+from data_transfer.utils import DeviceType, StudySite, cache
 
 fileConfig(config.logger_path)
 
@@ -15,6 +16,10 @@ if __name__ == "__main__":
     For BTF, additional args to query a period of data:
     >   python data_transfer/main.py [DeviceType] [StudySite] [days] [reference_day]
     >   [days] == -1 will trigger a historical query to the beginning of the IDEAFAST FS
+    For DRM, to list all records rather than those since the last run:
+    >   python data_transfer/main.py DRM [StudySite] full
+    To report which index MongoDB uses for each query on the records collection:
+    >   python data_transfer/main.py indexes
     """
 
     # Create this once upon setup
@@ -22,12 +27,17 @@ if __name__ == "__main__":
     config.data_path.mkdir(exist_ok=True)
     config.storage_vol.mkdir(exist_ok=True)
     config.upload_folder.mkdir(exist_ok=True)
+    indexes.apply_indexes()
+
+    if sys.argv[1] == "indexes":
+        indexes.log_index_usage()
+        sys.exit()
 
     device = DeviceType[sys.argv[1]]
     study_site = StudySite[sys.argv[2].capitalize()]
 
     if device == DeviceType.DRM:
-        drm.dag(study_site)
+        drm.dag(study_site, full="full" in sys.argv[3:])
     if device == DeviceType.SMA:
         sma.dag()
     if device == DeviceType.TFA:
@@ -40,3 +50,5 @@ if __name__ == "__main__":
         else:
             # passes timespan and reference if present
             btf.dag(study_site, *btf_params)
+
+    cache.log_metrics()
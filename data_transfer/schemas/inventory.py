@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from data_transfer.utils import format_weartime, normalise_day
+
+
+@dataclass
+class DeviceHistory:
+    """
+    A checkout of a device to a patient. Times are normalised to the day as
+    periods are compared by day; checkin is None while checked out.
+    """
+
+    patient_id: str
+    device_id: str
+    checkout: datetime
+    checkin: Optional[datetime]
+
+    @classmethod
+    def serialize(cls, payload: dict) -> DeviceHistory:
+        return cls(
+            patient_id=payload["patient_id"],
+            device_id=payload["device_id"],
+            checkout=normalise_day(format_weartime(payload["checkout"], "inventory")),
+            checkin=(
+                normalise_day(format_weartime(payload["checkin"], "inventory"))
+                if payload["checkin"]
+                else None
+            ),
+        )
@@ -1,9 +1,10 @@
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterable, Optional, Set
 
 from bson import ObjectId
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, PrivateAttr, validator
 
 from data_transfer.config import config
 
@@ -37,6 +38,27 @@ class Record(BaseModel):
     is_prepared: bool = False
     is_uploaded: bool = False
 
+    # fields assigned since loaded (or last saved) so updates only send those.
+    # NOTE: mutating a field in place, e.g. meta["key"] = value, is not tracked;
+    # reassign it instead, e.g. record.meta = {**record.meta, "key": value}
+    _changed: Set[str] = PrivateAttr(default_factory=set)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in self.__fields__:
+            self._changed.add(name)
+
+    def changed_fields(self) -> Set[str]:
+        """Fields assigned since this record was loaded or last saved."""
+        return set(self._changed)
+
+    def mark_saved(self, fields: Optional[Iterable[str]] = None) -> None:
+        """Stops tracking the given fields (by default, all) as changed."""
+        if fields is None:
+            self._changed.clear()
+        else:
+            self._changed.difference_update(fields)
+
     @validator("id")
     def validate_id(cls, id: str) -> ObjectId:
         """
@@ -45,6 +67,16 @@ class Record(BaseModel):
         """
         return ObjectId(id)
 
+    @classmethod
+    def from_db(cls, doc: dict) -> "Record":
+        """
+        Loads a Record without running validators, as documents in the DB
+        were validated when written. Validation still applies on assignment.
+        """
+        values = {k: v for k, v in doc.items() if k in cls.__fields__}
+        values["id"] = doc["_id"]
+        return cls.construct(**values)
+
     def metadata_path(self) -> Path:
         """Location of metadata for this record."""
         return self.download_folder() / f"{self.manufacturer_ref}-meta.json"
@@ -84,3 +116,18 @@ class Record(BaseModel):
             step = required_true.split("_")[1]
             raise ValueError(f"NOT ALLOWED: this Record is not {step} yet.")
         return set_value
+
+
+@dataclass
+class RecordSummary:
+    """
+    Lightweight, unvalidated view of a Record used to schedule tasks,
+    i.e. to group records and pass their IDs on.
+    """
+
+    # reduces memory by locking the number of fields
+    __slots__ = ["id", "patient_id", "device_id"]
+
+    id: ObjectId
+    patient_id: str
+    device_id: str
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from typing import List, Optional
 
 from data_transfer.utils import format_weartime
+from data_transfer.utils.intervals import IntervalIndex
 
 
 class DiseaseType(Enum):
@@ -75,6 +76,15 @@ class Device(DeviceBase, CommonBase):
 @dataclass
 class DeviceWithPatients(DeviceBase):
     patients: List[Patient]
+    # Indexed once when created, to look up patients by wear period
+    patients_by_wear: IntervalIndex[Patient] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        self.patients_by_wear = IntervalIndex(
+            (patient, patient.start_wear, patient.end_wear) for patient in self.patients
+        )
 
     @classmethod
     def serialize(cls, payload: dict) -> DeviceWithPatients:
@@ -87,6 +97,15 @@ class DeviceWithPatients(DeviceBase):
 @dataclass
 class PatientWithDevices(PatientBase):
     devices: List[Device]
+    # Indexed once when created, to look up devices by wear period
+    devices_by_wear: IntervalIndex[Device] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        self.devices_by_wear = IntervalIndex(
+            (device, device.start_wear, device.end_wear) for device in self.devices
+        )
 
     @classmethod
     def serialize(cls, payload: dict) -> PatientWithDevices:
@@ -1,6 +1,10 @@
+import hashlib
 import logging
+import os
 import shutil
+import zipfile
 from pathlib import Path
+from typing import IO, Optional, Tuple
 
 from dmpy.client import Dmpy
 from dmpy.core.payloads import FileUploadPayload
@@ -10,8 +14,61 @@ from data_transfer.utils import wear_time_in_ms
 log = logging.getLogger(__name__)
 
 
+class ChecksumWriter:
+    """
+    Writes to a file and computes its checksum (SHA256, as Dmpy.checksum) from
+    the bytes as they are written, so the file is not read again to upload it.
+
+    NOTE: not seekable, so zipfile writes each entry once, in order, rather than
+    seeking back to update its header (which would invalidate the checksum).
+    """
+
+    def __init__(self, file: IO[bytes]) -> None:
+        self.file = file
+        self.position = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.file.write(data)
+        self.sha256.update(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        """The file is closed by its owner, as zipfile does not close it."""
+        self.flush()
+
+    def checksum(self) -> str:
+        return self.sha256.hexdigest()
+
+
 def zip_folder(path: Path) -> Path:
-    return Path(shutil.make_archive(str(path), "zip", path))
+    return zip_folder_with_checksum(path)[0]
+
+
+def zip_folder_with_checksum(path: Path) -> Tuple[Path, str]:
+    """
+    Zips the contents of a folder to {path}.zip in a single pass, reading each
+    file once, and returns the zip with the checksum of its contents.
+    """
+    zip_path = Path(f"{path}.zip")
+
+    with open(zip_path, "wb") as zip_file:
+        writer = ChecksumWriter(zip_file)
+        with zipfile.ZipFile(writer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for root, folders, files in os.walk(path):
+                folders.sort()
+                for name in folders + sorted(files):
+                    file_path = Path(root) / name
+                    archive.write(file_path, file_path.relative_to(path))
+
+    return zip_path, writer.checksum()
 
 
 def zip_folder_and_rm_local(path: Path) -> Path:
@@ -21,14 +78,15 @@ def zip_folder_and_rm_local(path: Path) -> Path:
     return zip_path
 
 
-def upload(path: Path) -> bool:
+def upload(path: Path, checksum: Optional[str] = None) -> bool:
     """
-    Given a path to a zip folder to be uploaded
+    Given a path to a zip folder to be uploaded, and its checksum if known
+    (e.g. from zip_folder_with_checksum) so the zip is not read to compute it.
     """
     log.info(path)
     patient_id, device_id, start, end = path.stem.split("-")
 
-    checksum = Dmpy.checksum(path)
+    checksum = checksum or Dmpy.checksum(path)
     start_wear = wear_time_in_ms(start)
     end_wear = wear_time_in_ms(end)
 
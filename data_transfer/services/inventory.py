@@ -1,64 +1,108 @@
+from dataclasses import dataclass
 from datetime import datetime
-from functools import lru_cache
-from typing import Any, Optional
-
-import requests
+from typing import Any, Dict, Optional
 
 from data_transfer import utils
 from data_transfer.config import config
+from data_transfer.schemas.inventory import DeviceHistory
+from data_transfer.utils import http
+from data_transfer.utils.cache import ttl_cache
+from data_transfer.utils.intervals import IntervalIndex
+
+session = http.build_session(config.http_pool_size, config.http_retries)
+
+
+@dataclass
+class DeviceIndex:
+    """
+    Complete list of Devices of a model with a lookup of device IDs by serial.
+    """
+
+    # reduces memory by locking the number of fields
+    __slots__ = ["devices", "by_serial"]
+
+    devices: Any
+    by_serial: Dict[str, str]
 
 
-@lru_cache
 def all_devices_by_type(device_type: utils.DeviceType) -> Any:
     """
     Retrieve complete list of ALL Devices by model.
-    This is cached as response can be quite large and will be used multiple times per DAG."""
-    model_id = dict(BTF=6, DRM=8)[device_type.name]
-    response = requests.get(f"{config.inventory_api}devices/bytype/{model_id}")
-    return response.json()
+    This is cached as response can be quite large and will be used multiple times per DAG.
+    """
+    return __device_index(device_type).devices
 
 
 def device_id_by_serial(device_type: utils.DeviceType, serial: str) -> Optional[str]:
-    response = all_devices_by_type(device_type)
-    return next(
-        (i["device_id"] for i in response["data"] if i["serial"] == serial), None
-    )
+    return __device_index(device_type).by_serial.get(__normalise_serial(serial))
+
+
+def refresh_devices(device_type: Optional[utils.DeviceType] = None) -> None:
+    """Clears cached device listings (all, or by model) to request them again."""
+    if device_type:
+        __device_index.invalidate(device_type)
+    else:
+        __device_index.cache_clear()
 
 
-@lru_cache
-def device_history(device_id: str) -> Any:
-    response = requests.get(f"{config.inventory_api}device/history/{device_id}")
+@ttl_cache(len(utils.DeviceType), config.services_cache_seconds)
+def __device_index(device_type: utils.DeviceType) -> DeviceIndex:
+    """
+    Devices by model, requested again when expired (e.g. for new devices) and
+    indexed once per response, so serials are looked up without scanning.
+    """
+    model_id = dict(BTF=6, DRM=8)[device_type.name]
+    response = session.get(f"{config.inventory_api}devices/bytype/{model_id}")
+    devices = response.json()
+
+    by_serial: Dict[str, str] = {}
+    for device in devices["data"]:
+        if device["serial"]:
+            # NOTE: serials may be listed twice; the first listed device is used
+            by_serial.setdefault(
+                __normalise_serial(device["serial"]), device["device_id"]
+            )
+
+    return DeviceIndex(devices, by_serial)
+
+
+def __normalise_serial(serial: str) -> str:
+    return serial.strip().upper()
+
+
+@ttl_cache(config.services_cache_size, config.services_cache_seconds)
+def device_history(device_id: str) -> Optional[Dict[str, DeviceHistory]]:
+    """
+    Checkouts of a device by patient ID, parsed once when requested (and cached)
+    """
+    response = session.get(f"{config.inventory_api}device/history/{device_id}")
     # TODO: validation
     _response = response.json()
     if not _response["meta"]["success"]:
         return None
-    return _response["data"]
+    return {
+        patient_id: DeviceHistory.serialize(record)
+        for patient_id, record in _response["data"].items()
+    }
 
 
-@lru_cache
 def record_by_device_id(
     device_id: str, start_wear: datetime, end_wear: datetime
-) -> Optional[Any]:
+) -> Optional[DeviceHistory]:
+    index = __history_index(device_id)
+    return index.find(start_wear, end_wear) if index else None
+
+
+@ttl_cache(config.services_cache_size, config.services_cache_seconds)
+def __history_index(device_id: str) -> Optional[IntervalIndex[DeviceHistory]]:
+    """
+    History of a device by wear period (checkout to checkin, or today if not
+    checked in), indexed once per device as device_history is cached.
+    """
     history = device_history(device_id)
     if not history:
         return None
 
-    start_wear = utils.normalise_day(start_wear)
-    end_wear = utils.normalise_day(end_wear)
-
-    for record in history.values():
-        inventory_start_wear = utils.format_weartime(record["checkout"], "inventory")
-        checkin = record["checkin"] or datetime.now().strftime(
-            utils.FORMATS["inventory"]
-        )
-        inventory_end_wear = utils.format_weartime(checkin, "inventory")
-
-        inventory_start_wear = utils.normalise_day(inventory_start_wear)
-        inventory_end_wear = utils.normalise_day(inventory_end_wear)
-
-        within_start_period = inventory_start_wear <= start_wear <= inventory_end_wear
-        within_end_period = inventory_start_wear <= end_wear <= inventory_end_wear
-
-        if within_start_period and within_end_period:
-            return record
-    return None
+    return IntervalIndex(
+        (record, record.checkout, record.checkin) for record in history.values()
+    )
@@ -1,6 +1,9 @@
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
-from functools import lru_cache
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 
 import requests
 
@@ -11,12 +14,32 @@ from data_transfer.schemas.ucam import (
     Patient,
     PatientWithDevices,
 )
-from data_transfer.utils import normalise_day
+from data_transfer.utils import http
+from data_transfer.utils.cache import ttl_cache
 
+log = logging.getLogger(__name__)
 
-@lru_cache
+session = http.build_session(config.http_pool_size, config.http_retries)
+
+
+@dataclass
+class Snapshot:
+    """
+    All patients (and their devices) and BTF dots in UCAM, requested at once
+    and indexed by device, VTT and dot ID to serve lookups without requests.
+    """
+
+    devices: Dict[str, List[DeviceWithPatients]]
+    vtts: Dict[str, List[Patient]]
+    btf_dots: Dict[str, List[DeviceWithPatients]]
+
+
+_snapshot: Optional[Snapshot] = None
+
+
+@ttl_cache(config.services_cache_size, config.services_cache_seconds)
 def get_one_patient(patient_id: str) -> Optional[PatientWithDevices]:
-    response = requests.get(f"{config.ucam_api}patients/{patient_id}").json()
+    response = session.get(f"{config.ucam_api}patients/{patient_id}").json()
     return (
         PatientWithDevices.serialize(response["data"])
         if response["meta"]["success"]
@@ -24,9 +47,15 @@ def get_one_patient(patient_id: str) -> Optional[PatientWithDevices]:
     )
 
 
-@lru_cache
 def get_one_device(device_id: str) -> Optional[List[DeviceWithPatients]]:
-    response = requests.get(f"{config.ucam_api}devices/{device_id}").json()
+    if _snapshot:
+        return _snapshot.devices.get(device_id)
+    return __request_device(device_id)
+
+
+@ttl_cache(config.services_cache_size, config.services_cache_seconds)
+def __request_device(device_id: str) -> Optional[List[DeviceWithPatients]]:
+    response = session.get(f"{config.ucam_api}devices/{device_id}").json()
     return (
         [DeviceWithPatients.serialize(device) for device in response["data"]]
         if response["meta"]["success"]
@@ -35,7 +64,7 @@ def get_one_device(device_id: str) -> Optional[List[DeviceWithPatients]]:
 
 
 def get_all_vtt() -> Optional[List[Patient]]:
-    response = requests.get(f"{config.ucam_api}vtt/").json()
+    response = session.get(f"{config.ucam_api}vtt/").json()
     return (
         [Patient.serialize(vtt) for vtt in response["data"]]
         if response["meta"]["success"]
@@ -44,7 +73,9 @@ def get_all_vtt() -> Optional[List[Patient]]:
 
 
 def get_one_vtt(vtt_id: str) -> Optional[List[Patient]]:
-    response = requests.get(f"{config.ucam_api}vtt/{vtt_id}").json()
+    if _snapshot:
+        return _snapshot.vtts.get(vtt_id)
+    response = session.get(f"{config.ucam_api}vtt/{vtt_id}").json()
     return (
         [Patient.serialize(vtt) for vtt in response["data"]]
         if response["meta"]["success"]
@@ -52,13 +83,13 @@ def get_one_vtt(vtt_id: str) -> Optional[List[Patient]]:
     )
 
 
-@lru_cache(maxsize=1)
+@ttl_cache(1, config.services_cache_seconds)
 def get_all_btf_dots() -> Optional[List[DeviceWithPatients]]:
     """
     Temporary method to accomodate temporary BTF endpoint
     Cached, so we can look up with 'get_one_btf_dot'
     """
-    response = requests.get(f"{config.ucam_api}btf/").json()
+    response = session.get(f"{config.ucam_api}btf/").json()
     return (
         [DeviceWithPatients.serialize(device) for device in response["data"]]
         if response["meta"]["success"]
@@ -66,12 +97,105 @@ def get_all_btf_dots() -> Optional[List[DeviceWithPatients]]:
     )
 
 
-@lru_cache
 def get_one_btf_dot(dot_id: str) -> Optional[List[DeviceWithPatients]]:
+    if _snapshot:
+        return _snapshot.btf_dots.get(dot_id)
+    return __find_btf_dot(dot_id)
+
+
+@ttl_cache(config.services_cache_size, config.services_cache_seconds)
+def __find_btf_dot(dot_id: str) -> Optional[List[DeviceWithPatients]]:
     dots = [dot for dot in get_all_btf_dots() if dot.device_id == dot_id]
     return dots if dots else None
 
 
+def load_snapshot() -> bool:
+    """
+    Requests all patients (and their devices) and BTF dots at once, e.g. once
+    per DAG run, to serve get_one_device, get_one_vtt, get_one_btf_dot and the
+    wear period lookups from memory, rather than one request per ID.
+    If UCAM is unavailable, lookups fall back to requests per ID.
+    """
+    global _snapshot
+    _snapshot = None
+
+    data, btf_dots = None, None
+    try:
+        response = session.get(f"{config.ucam_api}patients").json()
+        if (response.get("meta") or {}).get("success"):
+            data = response.get("data")
+        if data is not None:
+            # NOTE: dots are not part of the patients payload (see consumer.services.ucam)
+            get_all_btf_dots.cache_clear()
+            btf_dots = get_all_btf_dots()
+    except (requests.RequestException, ValueError, KeyError):
+        # e.g. UCAM unavailable, or its response is not (the expected) JSON
+        log.error("UCAM snapshot request failed:", exc_info=True)
+
+    if data is None or btf_dots is None:
+        log.error("UCAM snapshot NOT loaded. Requesting UCAM per ID instead.")
+        get_all_btf_dots.cache_clear()  # do not keep a failed response
+        return False
+
+    patients = [PatientWithDevices.serialize(p) for p in data]
+    _snapshot = __snapshot(patients, btf_dots)
+    return True
+
+
+@contextmanager
+def snapshot_mode() -> Iterator[None]:
+    """Serves lookups from a snapshot (see load_snapshot) within the context"""
+    if config.ucam_snapshot:
+        load_snapshot()
+    try:
+        yield
+    finally:
+        clear_snapshot()
+
+
+def clear_snapshot() -> None:
+    """Lookups request UCAM per ID again"""
+    global _snapshot
+    _snapshot = None
+
+
+def __snapshot(
+    patients: List[PatientWithDevices], btf_dots: List[DeviceWithPatients]
+) -> Snapshot:
+    """Inverts patients (with devices) into patients by device and by VTT"""
+    by_device: Dict[str, List[Patient]] = defaultdict(list)
+    by_vtt: Dict[str, List[Patient]] = defaultdict(list)
+
+    for patient in patients:
+        for device in patient.devices:
+            worn = Patient(
+                start_wear=device.start_wear,
+                end_wear=device.end_wear,
+                deviations=device.deviations,
+                vttsma_id=device.vttsma_id,
+                patient_id=patient.patient_id,
+                disease=patient.disease,
+            )
+            if device.device_id:
+                by_device[device.device_id].append(worn)
+            if device.vttsma_id:
+                by_vtt[device.vttsma_id].append(worn)
+
+    devices = {
+        device_id: [DeviceWithPatients(device_id=device_id, patients=worn)]
+        for device_id, worn in by_device.items()
+    }
+    dots: Dict[str, List[DeviceWithPatients]] = defaultdict(list)
+    for dot in btf_dots:
+        dots[dot.device_id].append(dot)
+
+    return Snapshot(
+        devices=devices,
+        vtts=dict(by_vtt),
+        btf_dots=dict(dots),
+    )
+
+
 def patient_by_wear_period(
     device_id: str, start_wear: datetime, end_wear: datetime
 ) -> Optional[Patient]:
@@ -79,11 +203,7 @@ def patient_by_wear_period(
     If data was created on a certain period then it belongs to an individual patient.
     NOTE: returns DevicePatient, not Patient
     """
-    start_wear = normalise_day(start_wear)
-    end_wear = normalise_day(end_wear)
-    devices = get_one_device(device_id)
-
-    return determine_by_wear_period(devices, start_wear, end_wear)
+    return determine_by_wear_period(get_one_device(device_id), start_wear, end_wear)
 
 
 def patient_by_btfdot_wear_period(
@@ -93,11 +213,7 @@ def patient_by_btfdot_wear_period(
     If data was created on a certain period then it belongs to an individual patient.
     NOTE: returns DevicePatient, not Patient
     """
-    start_wear = normalise_day(start_wear)
-    end_wear = normalise_day(end_wear)
-    devices = get_one_btf_dot(device_id)
-
-    return determine_by_wear_period(devices, start_wear, end_wear)
+    return determine_by_wear_period(get_one_btf_dot(device_id), start_wear, end_wear)
 
 
 def determine_by_wear_period(
@@ -105,40 +221,21 @@ def determine_by_wear_period(
     start_wear: datetime,
     end_wear: datetime,
 ) -> Optional[Patient]:
-    """Reusable method to determine patient by wear period from a (list of) DeviceWithPatients"""
-    if devices:
-        for device in devices:
-            for patient in device.patients:
-                patient_start = normalise_day(patient.start_wear)
-                # if end_wear is none, use today
-                patient_end = normalise_day(patient.end_wear or datetime.today())
-
-                within_start_period = patient_start <= start_wear <= patient_end
-                within_end_period = patient_start <= end_wear <= patient_end
-
-                if within_start_period and within_end_period:
-                    return patient
+    """
+    Reusable method to determine patient by wear period from a (list of) DeviceWithPatients.
+    NOTE: looks up the index of each device, built once when it was requested
+    """
+    for device in devices or []:
+        if patient := device.patients_by_wear.find(start_wear, end_wear):
+            return patient
     return None
 
 
 def device_by_wear_period(
-    devices: List[Device], start_wear: datetime, end_wear: datetime
+    patient: PatientWithDevices, start_wear: datetime, end_wear: datetime
 ) -> Optional[Device]:
     """
     If data was created on a certain period then it belongs to an individual patient.
     NOTE: returns PatientDevice, not Device
     """
-    start_wear = normalise_day(start_wear)
-    end_wear = normalise_day(end_wear)
-
-    for device in devices:
-        device_start_wear = normalise_day(device.start_wear)
-        # if end_wear is none, use today
-        device_end_wear = normalise_day(device.end_wear or datetime.today())
-
-        within_start_period = device_start_wear <= start_wear <= device_end_wear
-        within_end_period = device_start_wear <= end_wear <= device_end_wear
-
-        if within_start_period and within_end_period:
-            return device
-    return None
+    return patient.devices_by_wear.find(start_wear, end_wear)
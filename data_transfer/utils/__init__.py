@@ -1,14 +1,12 @@
-import csv
 import hashlib
 import json
 import logging
 import re
 from datetime import datetime, timedelta
 from enum import Enum
-from functools import lru_cache
 from math import floor
 from pathlib import Path
-from typing import Any, List, Optional, Tuple
+from typing import Any, Optional, Tuple
 
 log = logging.getLogger(__name__)
 
@@ -67,17 +65,6 @@ def get_endwear_by_seconds(start: datetime, duration: int) -> datetime:
     return start + timedelta(seconds=duration)
 
 
-@lru_cache(maxsize=None)
-def read_csv_from_cache(path: Path) -> List[dict]:
-    """
-    Load full CSV into memory for quick lookup
-    NOTE: breaks if .csv not in right codec (i.e. saved from Excel)
-    """
-    with open(path) as csv_file:
-        data = [row for row in csv.DictReader(csv_file)]
-    return data
-
-
 def read_json(filepath: Path) -> Any:
     with open(filepath, "r") as f:
         data = f.read()
@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import update_wrapper
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    NamedTuple,
+    Tuple,
+    TypeVar,
+)
+
+log = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+
+class CacheInfo(NamedTuple):
+    # NOTE: hits and misses first, as with functools.lru_cache
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    maxsize: int
+    currsize: int
+
+
+class CachedFunction(Generic[R]):
+    """
+    Caches results of a function by its arguments, as functools.lru_cache, but
+    each result expires ttl seconds after it was cached, and once maxsize are
+    cached the least recently used is evicted. See ttl_cache.
+
+    NOTE: thread-safe, though concurrent misses of one key may call func twice.
+    """
+
+    def __init__(self, func: Callable[..., R], maxsize: int, ttl: float) -> None:
+        self.func = func
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._results: "OrderedDict[Hashable, Tuple[float, R]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, misses=0, evictions=0, expirations=0)
+        update_wrapper(self, func)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> R:
+        key = self.__key(args, kwargs)
+        with self._lock:
+            if key in self._results:
+                expires, value = self._results[key]
+                if time.monotonic() < expires:
+                    self._results.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._results[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+
+        # NOTE: not locked, as to not block other keys while e.g. requesting
+        value = self.func(*args, **kwargs)
+
+        with self._lock:
+            self._results[key] = (time.monotonic() + self.ttl, value)
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+                self._stats["evictions"] += 1
+        return value
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                maxsize=self.maxsize, currsize=len(self._results), **self._stats
+            )
+
+    def cache_clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._stats.update(hits=0, misses=0, evictions=0, expirations=0)
+
+    def invalidate(self, *args: Any, **kwargs: Any) -> None:
+        """Drops the result for these arguments, e.g. when known to be outdated."""
+        with self._lock:
+            self._results.pop(self.__key(args, kwargs), None)
+
+    @staticmethod
+    def __key(args: tuple, kwargs: dict) -> Hashable:
+        return (args, tuple(sorted(kwargs.items()))) if kwargs else args
+
+
+# All ttl_caches by function name, to report on or clear them together
+caches: Dict[str, CachedFunction] = {}
+
+
+def ttl_cache(
+    maxsize: int = 128, ttl: float = 60 * 60
+) -> Callable[[Callable[..., R]], CachedFunction[R]]:
+    """
+    Decorator to cache results for ttl seconds, up to maxsize results.
+    The cached function has cache_info(), cache_clear() and invalidate(*args).
+    """
+
+    def decorator(func: Callable[..., R]) -> CachedFunction[R]:
+        cached = CachedFunction(func, maxsize, ttl)
+        caches[f"{func.__module__}.{func.__qualname__}"] = cached
+        return cached
+
+    return decorator
+
+
+def clear_caches() -> None:
+    """Clears all ttl_caches, e.g. when UCAM or inventory data was corrected."""
+    for cached in caches.values():
+        cached.cache_clear()
+
+
+def metrics() -> List[Tuple[str, CacheInfo]]:
+    return [(name, cached.cache_info()) for name, cached in caches.items()]
+
+
+def log_metrics() -> None:
+    for name, info in metrics():
+        log.info(f"{name}: {info}")
@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: allows bursts of up to `capacity` calls that are
+    refilled at `rate` calls per second. Shared between threads of one vendor.
+
+    The rate adapts to the vendor: throttled() halves it and pauses all callers,
+    e.g., on HTTP 429, and succeeded() restores it step by step to its maximum.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1, min_rate: float = 0) -> None:
+        self.max_rate = rate
+        self.min_rate = min_rate or rate / 16
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        # a time in the future pauses refilling, see throttled()
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._updated:
+                    refill = (now - self._updated) * self.rate
+                    self._tokens = min(self.capacity, self._tokens + refill)
+                    self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                pause = max(self._updated - now, 0)
+                wait = pause + (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        """
+        Halves the rate and pauses all callers for retry_after seconds,
+        e.g. from a Retry-After header, or one interval at the new rate.
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after is not None else 1 / self.rate
+            self._tokens = 0
+            self._updated = max(self._updated, time.monotonic() + pause)
+
+    def succeeded(self) -> None:
+        """Recovers a tenth of the maximum rate after being throttled."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+def run_concurrently(
+    task: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int,
+    limiter: Optional[RateLimiter] = None,
+) -> List[R]:
+    """
+    Runs task for each item on a bounded pool of threads, optionally limiting
+    the rate at which tasks start. Results are returned in order of items.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(__limited(task, limiter), items))
+
+
+def iter_concurrently(
+    task: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int,
+    limiter: Optional[RateLimiter] = None,
+) -> Iterator[R]:
+    """
+    As run_concurrently, but yields results as tasks complete (in any order),
+    so they are processed while remaining tasks run. Items are consumed as
+    workers free up, so only a few results are held at a time.
+    """
+    items = iter(items)
+    limited_task = __limited(task, limiter)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {
+            executor.submit(limited_task, item)
+            for item in islice(items, max_workers * 2)
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending.update(
+                executor.submit(limited_task, item) for item in islice(items, len(done))
+            )
+            for future in done:
+                yield future.result()
+
+
+def __limited(
+    task: Callable[[T], R], limiter: Optional[RateLimiter]
+) -> Callable[[T], R]:
+    """Wraps task to wait for the limiter (if any) before it starts."""
+
+    def limited_task(item: T) -> R:
+        if limiter:
+            limiter.acquire()
+        return task(item)
+
+    return limited_task
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError
+from urllib3.util.retry import Retry
+
+log = logging.getLogger(__name__)
+
+# Bytes read from the socket and written to disk at once when downloading
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+
+# Requested when downloading, so the bytes written are those sent by the server
+# and an interrupted download can be resumed from its size
+IDENTITY = {"Accept-Encoding": "identity"}
+
+# Transient server errors retried for idempotent requests (e.g. GET).
+# NOTE: 429/502 are left to clients that handle throttling, e.g. lib.byteflies
+RETRY_STATUS_CODES = [500, 503, 504]
+
+
+def build_session(
+    pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.5
+) -> requests.Session:
+    """
+    Builds a session that keeps connections alive and pools up to pool_size
+    connections per host, so requests to a vendor reuse TCP/TLS connections.
+    Connection errors and RETRY_STATUS_CODES are retried with backoff.
+
+    NOTE: not configured from the environment here as it is shared by
+    data_transfer and consumer, which pass values from their own config.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        # return the last response so callers handle errors as before
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def download(
+    session: requests.Session,
+    url: str,
+    path: Path,
+    buffer_size: int = DOWNLOAD_BUFFER_SIZE,
+) -> int:
+    """
+    Streams a file to path, reading into one reused buffer of buffer_size, and
+    returns its size. Raises as session.get does, e.g. for HTTP errors, and
+    IOError if the connection closed before the whole file was read.
+
+    The file is written next to path as .part and renamed once complete, so path
+    only exists if the download succeeded. A failed download keeps its .part (and
+    the file's ETag and size) and is resumed by a Range request if the server
+    supports it and the file did not change. A complete file is not downloaded
+    again, i.e. if path exists with the size of the file at url.
+    """
+    path = Path(path)
+    if path.exists() and __remote_size(session, url) == path.stat().st_size:
+        log.info(f"Skipped {path.name}: already downloaded")
+        return path.stat().st_size
+
+    part = path.with_name(f"{path.name}.part")
+    part_state = path.with_name(f"{path.name}.part.json")
+    state = __read_state(part_state) if part.exists() else {}
+    offset = part.stat().st_size if state else 0
+
+    headers = dict(IDENTITY)
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        if state.get("etag"):
+            # the server sends the whole file instead if it changed
+            headers["If-Range"] = state["etag"]
+
+    started = time.monotonic()
+    with session.get(url, stream=True, headers=headers) as response:
+        log.debug(f"Headers from {url} were:\n    {response.headers}")
+        if response.status_code == 416:
+            # e.g. the .part is longer than the file, so start over next time
+            __discard(part, part_state)
+        response.raise_for_status()
+
+        resumed = offset if response.status_code == 206 else 0
+        # NOTE: without an ETag, If-Range cannot tell if the file changed, so the
+        # range must follow on from the .part, of a file of the same size
+        start, total = __content_range(response)
+        resumable = not resumed or (start == resumed and total == state.get("size"))
+        if resumable:
+            expected = __write(response, part, part_state, resumed, buffer_size)
+
+    if not resumable:
+        log.warning(f"Restarting download of {path.name}: its .part is outdated")
+        __discard(part, part_state)
+        return download(session, url, path, buffer_size)
+
+    size = part.stat().st_size
+    if expected is not None and size != expected:
+        raise IOError(f"Incomplete download of {path.name}: {size}/{expected} bytes")
+    os.replace(part, path)
+    part_state.unlink(missing_ok=True)
+
+    seconds = time.monotonic() - started
+    transferred = size - resumed
+    log.info(
+        f"Downloaded {path.name}: {transferred / 1e6:.1f}MB in {seconds:.1f}s "
+        f"({transferred / 1e6 / max(seconds, 1e-6):.1f}MB/s)"
+        + (f", resumed at {resumed / 1e6:.1f}MB" if resumed else "")
+    )
+    return size
+
+
+def __write(
+    response: requests.Response,
+    part: Path,
+    part_state: Path,
+    resumed: int,
+    buffer_size: int,
+) -> Optional[int]:
+    """
+    Writes (or appends, if resumed) the response to part, and returns the size
+    of the whole file if known. Stores the file's ETag and size in part_state,
+    so the download can be resumed if interrupted.
+    """
+    expected = __total_size(response)
+    if response.headers.get("Content-Encoding", "identity") == "identity":
+        etag = response.headers.get("ETag")
+        __write_state(part_state, dict(etag=etag, size=expected))
+    else:
+        # bytes written are decoded, so cannot be resumed by range
+        part_state.unlink(missing_ok=True)
+        expected = None
+        # as iter_content, e.g. if the server gzips the response
+        response.raw.decode_content = True
+
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(part, "ab" if resumed else "wb") as output_file:
+        try:
+            while read := response.raw.readinto(buffer):
+                output_file.write(view[:read])
+        except ProtocolError as e:
+            # as iter_content, e.g. if the connection closed before the end
+            raise requests.exceptions.ChunkedEncodingError(e)
+    return expected
+
+
+def __remote_size(session: requests.Session, url: str) -> Optional[int]:
+    """
+    Size of the file at url, requesting only its first byte, as e.g. presigned
+    URLs only allow GET requests.
+    """
+    headers = {**IDENTITY, "Range": "bytes=0-0"}
+    with session.get(url, stream=True, headers=headers) as response:
+        return __total_size(response) if response.ok else None
+
+
+def __total_size(response: requests.Response) -> Optional[int]:
+    """Size of the whole file, if known, of a (partial) response."""
+    if response.status_code == 206:
+        return __content_range(response)[1]
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def __content_range(response: requests.Response) -> Tuple[Optional[int], Optional[int]]:
+    """The first byte and size of the file of a partial response."""
+    match = re.match(
+        r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("Content-Range", "")
+    )
+    if not match:
+        return None, None
+    start, total = match.groups()
+    return int(start), int(total) if total.isdigit() else None
+
+
+def __read_state(path: Path) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            state: Dict[str, Any] = json.load(f)
+        return state
+    except (OSError, ValueError):
+        return {}
+
+
+def __write_state(path: Path, state: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(state, f)
+
+
+def __discard(part: Path, part_state: Path) -> None:
+    part.unlink(missing_ok=True)
+    part_state.unlink(missing_ok=True)
@@ -0,0 +1,58 @@
+import math
+from bisect import bisect_right
+from datetime import date, datetime
+from itertools import accumulate
+from typing import Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class IntervalIndex(Generic[T]):
+    """
+    Looks up values by the period (in days) they span, e.g. the patients who
+    wore a device. Periods are stored as day ordinals sorted by start, so a
+    lookup bisects rather than scans when periods do not overlap.
+
+    Periods without an end (e.g. still worn) last until today when looked up.
+    """
+
+    def __init__(
+        self, periods: Iterable[Tuple[T, datetime, Optional[datetime]]]
+    ) -> None:
+        entries = sorted(
+            (
+                (start.toordinal(), end.toordinal() if end else None, order, value)
+                for order, (value, start, end) in enumerate(periods)
+            ),
+            key=lambda entry: entry[0],
+        )
+        self._starts: List[int] = [entry[0] for entry in entries]
+        self._ends: List[Optional[int]] = [entry[1] for entry in entries]
+        self._orders: List[int] = [entry[2] for entry in entries]
+        self._values: List[T] = [entry[3] for entry in entries]
+        # latest end of the periods up to each position, to stop scanning early
+        self._max_ends = list(accumulate((end or math.inf for end in self._ends), max))
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def find(self, start: datetime, end: datetime) -> Optional[T]:
+        """
+        The value whose period spans both start and end (by day). If periods
+        overlap, the first given is returned.
+        """
+        start_day, end_day = start.toordinal(), end.toordinal()
+        today = date.today().toordinal()
+        found: Optional[int] = None
+
+        # only periods that start on or before both days can span them
+        position = bisect_right(self._starts, min(start_day, end_day))
+        for index in reversed(range(position)):
+            if self._max_ends[index] < max(start_day, end_day):
+                break
+            period_end = self._ends[index] or today
+            spans = start_day <= period_end and end_day <= period_end
+            if spans and (found is None or self._orders[index] < self._orders[found]):
+                found = index
+
+        return self._values[found] if found is not None else None
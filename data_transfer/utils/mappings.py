@@ -0,0 +1,85 @@
+import csv
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+log = logging.getLogger(__name__)
+
+# A column by its header name or position
+Column = Union[str, int]
+
+
+@dataclass
+class CsvMapping:
+    """
+    A two-column mapping of a CSV file, indexed by key and by value.
+    NOTE: keys (or values) listed twice map to the first listed row.
+    """
+
+    # reduces memory by locking the number of fields
+    __slots__ = ["modified", "by_key", "by_value"]
+
+    modified: Tuple[int, int]
+    by_key: Dict[str, str]
+    by_value: Dict[str, str]
+
+
+# Loaded mappings by file and columns, loaded again when their file changed
+mappings: Dict[Tuple[Path, Column, Column], CsvMapping] = {}
+mappings_lock = threading.Lock()
+
+
+def load(path: Path, key: Column = 0, value: Column = 1) -> CsvMapping:
+    """
+    Mapping of the key to the value column of a CSV (e.g. in config.csvs_path),
+    read once and read again only when the file was modified.
+    NOTE: breaks if .csv not in right codec (i.e. saved from Excel)
+    """
+    stat = os.stat(path)
+    modified = (stat.st_mtime_ns, stat.st_size)
+
+    with mappings_lock:
+        mapping = mappings.get((path, key, value))
+        if mapping and mapping.modified == modified:
+            return mapping
+
+        mapping = __read(path, key, value, modified)
+        mappings[(path, key, value)] = mapping
+        return mapping
+
+
+def value_by_key(
+    path: Path, needle: str, key: Column = 0, value: Column = 1
+) -> Optional[str]:
+    return load(path, key, value).by_key.get(needle)
+
+
+def key_by_value(
+    path: Path, needle: str, key: Column = 0, value: Column = 1
+) -> Optional[str]:
+    return load(path, key, value).by_value.get(needle)
+
+
+def __read(
+    path: Path, key: Column, value: Column, modified: Tuple[int, int]
+) -> CsvMapping:
+    log.debug(f"Loading mapping from: {path}")
+    by_key: Dict[str, str] = {}
+    by_value: Dict[str, str] = {}
+
+    with open(path, newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        key_index = header.index(key) if isinstance(key, str) else key
+        value_index = header.index(value) if isinstance(value, str) else value
+
+        for row in reader:
+            if len(row) <= max(key_index, value_index):
+                continue
+            by_key.setdefault(row[key_index], row[value_index])
+            by_value.setdefault(row[value_index], row[key_index])
+
+    return CsvMapping(modified, by_key, by_value)
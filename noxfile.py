@@ -49,10 +49,10 @@ def lint(session: nox.Session) -> None:
 def tests(session: nox.Session) -> None:
     """
     Setup for automated testing with pytest
-    NOTE: Ignores live integration tests marked 'live'
-    Include these using `pytest -v` or only with `poetry nox -rs live_tests`
+    NOTE: Ignores live integration tests marked 'live' and slow tests marked 'benchmark'
+    Include these using `pytest -v` or only with `poetry nox -rs live_tests`/`benchmarks`
     """
-    session.run("poetry", "run", "pytest", "-v", "-m", "not live")
+    session.run("poetry", "run", "pytest", "-v", "-m", "not live and not benchmark")
 
     # NOTE: Old and perhaps proper approach below. But issues prevent it to be ran on
     # all dev's machines. Needs further investigation. Definitely a local issue.
@@ -69,3 +69,11 @@ def live_tests(session: nox.Session) -> None:
     Pytests for live integration tests
     """
     session.run("poetry", "run", "pytest", "-v", "-m", "live")
+
+
+@session(python=["3.8"])
+def benchmarks(session: nox.Session) -> None:
+    """
+    Pytests against large synthetic datasets
+    """
+    session.run("poetry", "run", "pytest", "-v", "-m", "benchmark")
@@ -20,12 +20,22 @@ folder = Path(__file__).parent
 @pytest.fixture(scope="module")
 def mock_config() -> Generator[MagicMock, None, None]:
 
-    nconfig = MagicMock(byteflies_api_url="mock://mock_url.com")
+    nconfig = MagicMock(
+        byteflies_api_url="mock://mock_url.com",
+        byteflies_max_requests=4,
+        download_buffer_size=1024,
+    )
 
     with patch.object(lib, "config", nconfig) as mockconfig:
         yield mockconfig
 
 
+@pytest.fixture(autouse=True)
+def mock_recording_cache() -> Generator[dict, None, None]:
+    with patch.dict(lib.recording_cache, clear=True) as cache:
+        yield cache
+
+
 @pytest.fixture
 def mock_requests_session(mock_config: Generator[MagicMock, None, None]) -> dict:
     byteflies_response = utils.read_json(Path(f"{folder}/data/byteflies_payload.json"))
@@ -91,10 +101,11 @@ def populated_db(mock_city: Mock) -> Collection:
     # note that authentication is patched, can test with mock_authenticate.assert_called_once()
     btf_class = byteflies.Byteflies(mock_city)
 
-    for item in byteflies_itemised:
+    for payload in byteflies_itemised:
+        item = lib.RecordingFile(payload, **payload.pop("IDEAFAST"))
         recording = btf_class.recording_metadata(item)
         record = Record(
-            hash=item["IDEAFAST"]["hash"],
+            hash=item.hash,
             manufacturer_ref=recording.recording_id,
             device_type=utils.DeviceType.BTF.name,
             device_id=recording.dot_id,
@@ -0,0 +1,16 @@
+from typing import Generator
+from unittest.mock import patch
+
+import mongomock
+import pytest
+from pymongo.database import Database
+
+from data_transfer.db import main as db
+
+
+@pytest.fixture
+def mock_db() -> Generator[Database, None, None]:
+    database = mongomock.MongoClient().db
+
+    with patch.object(db, "_db", database):
+        yield database
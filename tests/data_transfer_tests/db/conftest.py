@@ -0,0 +1,24 @@
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+import pytest
+
+from data_transfer.schemas.record import Record
+
+
+@pytest.fixture
+def make_record() -> Callable[..., Record]:
+    def _make_record(hash: str, **kwargs: Any) -> Record:
+        fields: Dict[str, Any] = dict(
+            hash=hash,
+            manufacturer_ref=f"ref_{hash}",
+            device_type="BTF",
+            device_id="BTF-DEVICE",
+            patient_id="A-PATIENT",
+            start_wear=datetime(2021, 3, 22),
+            end_wear=datetime(2021, 3, 23),
+        )
+        fields.update(kwargs)
+        return Record(**fields)
+
+    return _make_record
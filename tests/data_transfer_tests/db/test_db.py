@@ -0,0 +1,215 @@
+from datetime import datetime
+from typing import Callable
+from unittest.mock import patch
+
+from bson import ObjectId
+from pymongo.database import Database
+
+from data_transfer.db import main as db
+from data_transfer.schemas.record import Record, RecordSummary
+from data_transfer.utils import DeviceType, StudySite
+
+
+def test_unknown_hashes(mock_db: Database, make_record: Callable[..., Record]) -> None:
+    for hash in ["known_1", "known_2"]:
+        db.create_record(make_record(hash))
+
+    result = db.unknown_hashes(["known_1", "new_1", "known_2", "new_2", "new_1"])
+
+    assert result == {"new_1", "new_2"}
+
+
+def test_unknown_hashes_batched(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    db.create_record(make_record("known_1"))
+    candidates = [f"new_{i}" for i in range(25)] + ["known_1"]
+
+    with patch.object(db, "HASH_BATCH_SIZE", 10), patch.object(
+        mock_db.records, "find", wraps=mock_db.records.find
+    ) as find:
+        result = db.unknown_hashes(candidates)
+
+    assert len(result) == 25
+    assert find.call_count == 3
+
+
+def test_unknown_hashes_empty(mock_db: Database) -> None:
+    result = db.unknown_hashes([])
+
+    assert result == set()
+
+
+def test_update_records(mock_db: Database, make_record: Callable[..., Record]) -> None:
+    records = []
+    for hash in ["hash_1", "hash_2", "hash_3"]:
+        record = make_record(hash, is_downloaded=True, is_processed=True)
+        record = db.read_record(db.create_record(record))
+        record.is_prepared = True
+        record.dmp_folder = "dmp_folder"
+        records.append(record)
+
+    with patch.object(
+        mock_db.records, "bulk_write", wraps=mock_db.records.bulk_write
+    ) as bulk_write:
+        db.update_records(records)
+
+    result = db.records_by_dmp_folder("dmp_folder")
+
+    assert bulk_write.call_count == 1
+    assert len(result) == 3
+    assert all(r.is_prepared for r in result)
+
+
+def test_update_records_given_fields(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    record = db.read_record(db.create_record(make_record("hash_1")))
+    record.is_downloaded = True
+    record.meta = dict(ignored="not in fields")
+
+    db.update_records([record], ["is_downloaded"])
+
+    result = db.read_record(record.id)
+
+    assert result.is_downloaded
+    assert result.meta == {}
+    # the fields not written are still tracked for a later update
+    assert record.changed_fields() == {"meta"}
+    db.update_record(record)
+    assert db.read_record(record.id).meta == dict(ignored="not in fields")
+
+
+def test_update_records_empty(mock_db: Database) -> None:
+    with patch.object(mock_db.records, "bulk_write") as bulk_write:
+        db.update_records([], ["is_prepared"])
+
+    assert bulk_write.call_count == 0
+
+
+def test_update_record_changed_fields_only(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    record_id = db.create_record(make_record("hash_1", meta=dict(large="payload")))
+    record = db.read_record(record_id)
+    record.is_downloaded = True
+
+    with patch.object(
+        mock_db.records, "update_one", wraps=mock_db.records.update_one
+    ) as update_one:
+        db.update_record(record)
+
+    result = update_one.call_args.args[1]
+
+    assert result == {"$set": {"is_downloaded": True}}
+    assert db.read_record(record_id).is_downloaded
+    assert record.changed_fields() == set()
+
+
+def test_update_record_unchanged(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    record = db.read_record(db.create_record(make_record("hash_1")))
+
+    with patch.object(mock_db.records, "update_one") as update_one:
+        db.update_record(record)
+
+    assert update_one.call_count == 0
+
+
+def test_filtered_records_skip_validation(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    # would fail validation: processed before downloaded
+    document = dict(make_record("hash_1").dict(), is_processed=True)
+    mock_db.records.insert_one(document)
+
+    result = db.records_not_uploaded(DeviceType.BTF)["A-PATIENT/BTF-DEVICE"]
+
+    assert result[0].is_processed
+    assert isinstance(result[0].id, ObjectId)
+    assert result[0].changed_fields() == set()
+
+
+def test_record_summaries_not_uploaded(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    for hash in ["hash_1", "hash_2"]:
+        db.create_record(make_record(hash))
+    db.create_record(make_record("hash_3", device_id="BTF-OTHER"))
+
+    result = dict(db.record_summaries_not_uploaded(DeviceType.BTF))
+
+    assert len(result["A-PATIENT/BTF-DEVICE"]) == 2
+    assert len(result["A-PATIENT/BTF-OTHER"]) == 1
+    assert isinstance(result["A-PATIENT/BTF-OTHER"][0], RecordSummary)
+
+
+def test_record_summaries_not_uploaded_streams_groups(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    for num in range(3):
+        db.create_record(make_record(f"hash_{num}", patient_id=f"A-PATIENT{num}"))
+
+    groups = db.record_summaries_not_uploaded(DeviceType.BTF)
+    patient_device, records = next(groups)
+    # e.g. uploaded while the first group was processed
+    mock_db.records.update_many(
+        {"patient_id": "A-PATIENT1"}, {"$set": {"is_uploaded": True}}
+    )
+
+    result = [patient_device] + [key for key, _ in groups]
+
+    assert result == ["A-PATIENT0/BTF-DEVICE", "A-PATIENT2/BTF-DEVICE"]
+
+
+def test_all_records_downloaded(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    for hash in ["hash_1", "hash_2"]:
+        db.create_record(make_record(hash, is_downloaded=True))
+    records = [
+        r
+        for _, group in db.record_summaries_not_uploaded(DeviceType.BTF)
+        for r in group
+    ]
+
+    with patch.object(mock_db.records, "find_one") as find_one:
+        result = db.all_records_downloaded(records)
+
+    assert result
+    assert find_one.call_count == 0
+
+
+def test_not_all_records_downloaded(
+    mock_db: Database, make_record: Callable[..., Record]
+) -> None:
+    db.create_record(make_record("hash_1", is_downloaded=True))
+    db.create_record(make_record("hash_2"))
+    records = [
+        r
+        for _, group in db.record_summaries_not_uploaded(DeviceType.BTF)
+        for r in group
+    ]
+
+    result = db.all_records_downloaded(records)
+
+    assert not result
+
+
+def test_read_watermark_unknown(mock_db: Database) -> None:
+    result = db.read_watermark(DeviceType.DRM, StudySite.Kiel)
+
+    assert result is None
+
+
+def test_update_watermark_by_site(mock_db: Database) -> None:
+    db.update_watermark(DeviceType.DRM, StudySite.Kiel, "new", datetime(2021, 3, 22))
+    db.update_watermark(DeviceType.DRM, StudySite.Kiel, "old", datetime(2021, 3, 1))
+    db.update_watermark(DeviceType.DRM, StudySite.Muenster, "a", datetime(2021, 1, 1))
+
+    result = db.read_watermark(DeviceType.DRM, StudySite.Kiel)
+
+    # may move back, e.g. to a record skipped in the last listing
+    assert result == datetime(2021, 3, 1)
+    assert mock_db.watermarks.find_one({"_id": "DRM/Kiel"})["record_id"] == "old"
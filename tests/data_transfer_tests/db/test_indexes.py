@@ -0,0 +1,66 @@
+from unittest.mock import MagicMock, patch
+
+from pymongo.database import Database
+
+from data_transfer.db import indexes
+
+
+def test_apply_indexes(mock_db: Database) -> None:
+    indexes.apply_indexes()
+
+    result = mock_db.records.index_information()
+
+    assert result["hash_1"]["unique"] is True
+    assert len(result) == len(indexes.RECORD_INDEXES) + 1  # including _id
+
+
+def test_apply_indexes_idempotent(mock_db: Database) -> None:
+    # as reported by MongoDB for indexes created from the declarations
+    existing = {
+        index.document["name"]: dict(
+            index.document, key=list(index.document["key"].items()), v=2
+        )
+        for index in indexes.RECORD_INDEXES
+    }
+
+    with patch.object(
+        mock_db.records, "index_information", return_value=existing
+    ), patch.object(mock_db.records, "drop_index") as drop_index:
+        indexes.apply_indexes()
+
+    assert drop_index.call_count == 0
+
+
+def test_apply_indexes_rebuilds_changed(mock_db: Database) -> None:
+    mock_db.records.create_index("dmp_folder", name="dmp_folder", unique=True)
+
+    indexes.apply_indexes()
+
+    result = mock_db.records.index_information()["dmp_folder"]
+    assert "unique" not in result
+
+
+def test_index_usage(mock_db: Database) -> None:
+    plan = {
+        "stage": "FETCH",
+        "inputStage": {"stage": "IXSCAN", "indexName": "not_uploaded"},
+    }
+    cursor = MagicMock()
+    cursor.explain.return_value = {"queryPlanner": {"winningPlan": plan}}
+
+    with patch.object(mock_db.records, "find", return_value=cursor):
+        result = indexes.index_usage()
+
+    assert set(result.values()) == {"not_uploaded"}
+
+
+def test_index_usage_collscan(mock_db: Database) -> None:
+    cursor = MagicMock()
+    cursor.explain.return_value = {
+        "queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}
+    }
+
+    with patch.object(mock_db.records, "find", return_value=cursor):
+        result = indexes.index_usage()
+
+    assert result["records_by_dmp_folder"] == "COLLSCAN"
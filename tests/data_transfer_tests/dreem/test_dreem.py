@@ -0,0 +1,172 @@
+from datetime import datetime
+from typing import Dict, Generator, List, Optional
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from data_transfer.devices import dreem as device
+from data_transfer.lib import dreem as dreem_api
+from data_transfer.utils import StudySite
+
+SINCE = datetime(2021, 3, 22)
+
+
+@pytest.fixture(autouse=True)
+def mock_config() -> Generator[MagicMock, None, None]:
+    with patch.object(dreem_api, "config", MagicMock(dreem_api_url="")) as config:
+        yield config
+
+
+def records(offsets: List[Optional[int]]) -> List[Dict]:
+    """Records started offsets seconds from SINCE (None: no report yet)."""
+    since = int(SINCE.timestamp())
+    return [
+        {
+            "id": f"record_{offset}",
+            "report": (
+                {"start_time": since + offset, "stop_time": since + offset + 1}
+                if offset is not None
+                else None
+            ),
+        }
+        for offset in offsets
+    ]
+
+
+def page(offsets: List[Optional[int]], next: Optional[str]) -> MagicMock:
+    """A response listing records started offsets seconds from SINCE."""
+    response = MagicMock()
+    response.json.return_value = {"results": records(offsets), "next": next}
+    return response
+
+
+def pages(*offsets: List[Optional[int]]) -> List[MagicMock]:
+    return [
+        page(offset, f"page_{num + 2}" if num + 1 < len(offsets) else None)
+        for num, offset in enumerate(offsets)
+    ]
+
+
+def test_get_restricted_list_all() -> None:
+    session = MagicMock()
+    session.get.side_effect = pages([20, None], [10, -10], [-20, -30], [-40], [-50])
+
+    result = dreem_api.get_restricted_list(session, "user")
+
+    assert len(result) == 8
+    assert session.get.call_count == 5
+
+
+def test_get_restricted_list_since() -> None:
+    session = MagicMock()
+    session.get.side_effect = pages([20, None], [10, -10], [-20, -30], [-40], [-50])
+
+    result = dreem_api.get_restricted_list(session, "user", SINCE)
+
+    # stops after two pages of records that all started before since
+    assert [r["id"] for r in result] == ["record_20", "record_None", "record_10"]
+    assert session.get.call_count == 4
+
+
+def test_get_restricted_list_since_not_ordered() -> None:
+    session = MagicMock()
+    session.get.side_effect = pages([20], [-20, -30], [10], [-40], [-50])
+
+    result = dreem_api.get_restricted_list(session, "user", SINCE)
+
+    # a newer record after an older page: all records are listed
+    assert len(result) == 6
+    assert session.get.call_count == 5
+
+
+@pytest.fixture
+def dreem() -> Generator[device.Dreem, None, None]:
+    with patch.object(device.Dreem, "authenticate", return_value=("user", None)):
+        yield device.Dreem(StudySite.Kiel)
+
+
+def test_watermark_at_oldest_skipped(dreem: device.Dreem) -> None:
+    listed = records([30, 20, 10])
+    for record in listed:
+        record["device"], record["user"] = record["id"], "user"
+
+    def serial_by_device(device_id: str) -> Optional[str]:
+        # the device of the record started at 20 is unknown
+        return None if device_id == "record_20" else "serial"
+
+    with patch.object(
+        device.dreem_api, "get_restricted_list", return_value=listed
+    ), patch.object(
+        device.dreem_api, "serial_by_device", side_effect=serial_by_device
+    ), patch.object(
+        device.dreem_api, "patient_id_by_user", return_value="K-NXYP6F"
+    ), patch.object(
+        device.inventory, "device_id_by_serial", return_value="ABC-FYCRXH"
+    ), patch.object(
+        device, "unknown_hashes", side_effect=set
+    ), patch.object(
+        device, "create_record"
+    ) as create_record, patch.object(
+        device.utils, "write_json"
+    ), patch.object(
+        device, "read_watermark", return_value=None
+    ), patch.object(
+        device, "update_watermark"
+    ) as update_watermark:
+        dreem.download_metadata()
+
+    result = update_watermark.call_args.args
+
+    # the skipped record is listed again, though newer records were stored
+    assert result[2] == "record_20"
+    assert create_record.call_count == 2
+
+
+def test_watermark_past_skipped_for_too_long(dreem: device.Dreem) -> None:
+    day = 24 * 60 * 60
+    listed = records([31 * day, 20, 10])
+    for record in listed:
+        record["device"], record["user"] = record["id"], "user"
+
+    with patch.object(
+        device.dreem_api, "get_restricted_list", return_value=listed
+    ), patch.object(
+        device.dreem_api, "serial_by_device", return_value="serial"
+    ), patch.object(
+        device.dreem_api, "patient_id_by_user", return_value=None
+    ), patch.object(
+        device.inventory, "device_id_by_serial", return_value="ABC-FYCRXH"
+    ), patch.object(
+        dreem, "_Dreem__patient_id_from_ucam", return_value=None
+    ), patch.object(
+        dreem, "_Dreem__patient_id_from_inventory", return_value=None
+    ), patch.object(
+        device, "unknown_hashes", side_effect=set
+    ), patch.object(
+        device, "read_watermark", return_value=None
+    ), patch.object(
+        device, "update_watermark"
+    ) as update_watermark:
+        dreem.download_metadata()
+
+    result = update_watermark.call_args.args
+
+    # no patient is ever found, yet records skipped 30+ days ago do not pin it
+    assert result[2] == f"record_{31 * day}"
+
+
+def test_watermark_at_newest_stored(dreem: device.Dreem) -> None:
+    listed = records([30, 20, 10])
+
+    with patch.object(
+        device.dreem_api, "get_restricted_list", return_value=listed
+    ), patch.object(device, "unknown_hashes", return_value=set()), patch.object(
+        device, "read_watermark", return_value=SINCE
+    ), patch.object(
+        device, "update_watermark"
+    ) as update_watermark:
+        dreem.download_metadata()
+
+    result = update_watermark.call_args.args
+
+    assert result[2:] == ("record_30", datetime.fromtimestamp(SINCE.timestamp() + 30))
@@ -0,0 +1,75 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Generator, Iterable, List
+from unittest.mock import patch
+
+import pytest
+from pymongo.database import Database
+
+from data_transfer.db import main as db
+from data_transfer.jobs import shared
+from data_transfer.schemas.record import Record, RecordSummary
+from data_transfer.utils import DeviceType
+
+
+@pytest.fixture
+def mock_folders(tmp_path: Path) -> Generator[Path, None, None]:
+    with patch.object(shared.config, "storage_vol", tmp_path / "storage"), patch.object(
+        shared.config, "upload_folder", tmp_path / "upload"
+    ):
+        yield tmp_path
+
+
+def create_records(device_id: str, is_processed: bool = True) -> List[RecordSummary]:
+    summaries = []
+    for day in [22, 23]:
+        fields: Dict[str, Any] = dict(
+            hash=f"{device_id}_{day}",
+            manufacturer_ref=f"ref_{day}",
+            device_type="BTF",
+            device_id=device_id,
+            patient_id="A-PATIENT",
+            start_wear=datetime(2021, 3, day),
+            end_wear=datetime(2021, 3, day + 1),
+            is_downloaded=True,
+            is_processed=is_processed,
+        )
+        mongo_id = db.create_record(Record(**fields))
+        summaries.append(RecordSummary(mongo_id, "A-PATIENT", device_id))
+    return summaries
+
+
+def test_prepare_data_folders_group(mock_db: Database, mock_folders: Path) -> None:
+    records = create_records("BTF-DEVICE")
+    create_records("BTF-OTHER")
+    for device_id in ["BTF-DEVICE", "BTF-OTHER"]:
+        (mock_folders / "storage" / "BTF" / "A-PATIENT" / device_id).mkdir(parents=True)
+
+    loaded: List[List[str]] = []
+
+    def records_by_ids(ids: Iterable[str]) -> List[Record]:
+        loaded.append(list(ids))
+        return db.records_by_ids(loaded[-1])
+
+    with patch.object(shared, "records_by_ids", side_effect=records_by_ids):
+        shared.prepare_data_folders(DeviceType.BTF, records)
+
+    result = db.records_by_dmp_folder("APATIENT-BTFDEVICE-20210322-20210324")
+
+    assert len(result) == 2
+    assert all(record.is_prepared for record in result)
+    assert (mock_folders / "upload" / "BTF" / result[0].dmp_folder).is_dir()
+    # the other group is left for its own iteration
+    assert (mock_folders / "storage" / "BTF" / "A-PATIENT" / "BTF-OTHER").is_dir()
+    # only the streamed group is loaded
+    assert loaded == [[record.id for record in records]]
+
+
+def test_prepare_data_folders_not_processed(
+    mock_db: Database, mock_folders: Path
+) -> None:
+    records = create_records("BTF-DEVICE", is_processed=False)
+
+    shared.prepare_data_folders(DeviceType.BTF, records)
+
+    assert not (mock_folders / "upload").exists()
@@ -80,3 +80,42 @@ def test_skip_validation_if_set_false() -> None:
     result = Record.is_set_true_after(value, {}, "")
 
     assert result is value
+
+
+def test_changed_fields_empty_on_load(get_record: Record) -> None:
+    result = get_record.changed_fields()
+
+    assert result == set()
+
+
+def test_changed_fields_tracks_assignment(get_record: Record) -> None:
+    get_record.is_downloaded = True
+    get_record.meta = {**get_record.meta, "filesize": 1}
+
+    result = get_record.changed_fields()
+
+    assert result == {"is_downloaded", "meta"}
+
+
+def test_changed_fields_cleared_when_saved(get_record: Record) -> None:
+    get_record.is_downloaded = True
+    get_record.mark_saved()
+
+    result = get_record.changed_fields()
+
+    assert result == set()
+
+
+def test_from_db_validates_assignment(get_record: Record) -> None:
+    record = Record.from_db(dict(get_record.dict(), _id="60a6f8d1e4b0c1a2b3c4d5e6"))
+
+    record.is_downloaded = True
+
+    assert record.changed_fields() == {"is_downloaded"}
+
+
+@pytest.mark.xfail(raises=ValueError, strict=True)
+def test_from_db_not_allowed_processed(get_record: Record) -> None:
+    record = Record.from_db(dict(get_record.dict(), _id="60a6f8d1e4b0c1a2b3c4d5e6"))
+
+    record.is_processed = True  # act
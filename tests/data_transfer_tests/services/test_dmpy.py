@@ -0,0 +1,24 @@
+import zipfile
+from pathlib import Path
+
+from data_transfer.services import dmpy
+
+
+def test_zip_folder_with_checksum(tmp_path: Path) -> None:
+    folder = tmp_path / "APATIENT-BTFDEVICE-20210322-20210323"
+    (folder / "metadata").mkdir(parents=True)
+    (folder / "signal.csv").write_bytes(b"0123456789" * 1000)
+    (folder / "metadata" / "recording.json").write_text("{}")
+
+    zip_path, result = dmpy.zip_folder_with_checksum(folder)
+
+    # as computed by dmpy when uploading the zip without a checksum
+    assert result == dmpy.Dmpy.checksum(zip_path)
+    with zipfile.ZipFile(zip_path) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [
+            "metadata/",
+            "signal.csv",
+            "metadata/recording.json",
+        ]
+        assert archive.read("signal.csv") == b"0123456789" * 1000
@@ -1,7 +1,11 @@
+from datetime import datetime
 from unittest.mock import MagicMock, patch
 
 from data_transfer import utils
+from data_transfer.config import config
+from data_transfer.schemas import inventory as inventory_schemas
 from data_transfer.services import inventory
+from data_transfer.utils import cache
 
 
 def test_record_by_device_id_date_within(
@@ -10,13 +14,13 @@ def test_record_by_device_id_date_within(
     response = MagicMock()
     response.json = lambda: mock_inventory_history_response
 
-    with patch("requests.get", return_value=response):
+    with patch.object(inventory.session, "get", return_value=response):
         start_wear = utils.format_weartime("2021-03-22 12:11:55", "inventory")
         end_wear = utils.format_weartime("2021-03-22 22:11:55", "inventory")
 
-        result = inventory.record_by_device_id("BTF-123456", start_wear, end_wear)[
-            "patient_id"
-        ]
+        result = inventory.record_by_device_id(
+            "BTF-123456", start_wear, end_wear
+        ).patient_id
 
         assert result == "A-ABCDEF"
 
@@ -28,7 +32,7 @@ def test_record_by_device_id_history_is_none(
     response = MagicMock()
     response.json = lambda: mock_inventory_history_response
 
-    with patch("requests.get", return_value=response):
+    with patch.object(inventory.session, "get", return_value=response):
         start_wear = utils.format_weartime("2021-03-17 12:11:55", "inventory")
         end_wear = utils.format_weartime("2021-03-17 22:11:55", "inventory")
 
@@ -46,7 +50,7 @@ def test_device_history_failure(
     mock_inventory_history_response["meta"]["success"] = False
     response.json = lambda: mock_inventory_history_response
 
-    with patch("requests.get", return_value=response):
+    with patch.object(inventory.session, "get", return_value=response):
 
         result = inventory.device_history("BTF-123456")
 
@@ -61,13 +65,48 @@ def test_device_history_success(
     response = MagicMock()
     response.json = lambda: mock_inventory_history_response
 
-    with patch("requests.get", return_value=response):
+    with patch.object(inventory.session, "get", return_value=response):
 
         result = inventory.device_history("BTF-123456")
 
         assert "A-ABCDEF" in result
 
 
+def test_device_history_parsed(
+    mock_inventory_history_response: dict,
+    mock_inv_config: MagicMock,
+) -> None:
+    inventory.device_history.cache_clear()
+    response = MagicMock()
+    response.json = lambda: mock_inventory_history_response
+
+    with patch.object(inventory.session, "get", return_value=response):
+
+        result = inventory.device_history("BTF-123456")
+
+        assert result["A-ABCDEF"].checkin is None  # not checked in
+        assert result["A-HIJKLM"].checkout == datetime(2021, 1, 26)
+        assert result["A-HIJKLM"].checkin == datetime(2021, 2, 3)
+
+
+def test_record_by_device_id_without_parsing(
+    mock_inventory_history_response: dict, mock_inv_config: MagicMock
+) -> None:
+    response = MagicMock()
+    response.json = lambda: mock_inventory_history_response
+    start_wear = utils.format_weartime("2021-01-27 12:11:55", "inventory")
+    end_wear = utils.format_weartime("2021-01-28 22:11:55", "inventory")
+
+    with patch.object(inventory.session, "get", return_value=response):
+        inventory.device_history("BTF-123456")
+
+        with patch.object(inventory_schemas, "format_weartime") as format_weartime:
+            result = inventory.record_by_device_id("BTF-123456", start_wear, end_wear)
+
+        assert result.patient_id == "A-HIJKLM"
+        assert format_weartime.call_count == 0
+
+
 def test_record_by_device_id_date_outside(
     mock_inventory_history_response: dict,
     mock_inv_config: MagicMock,
@@ -75,7 +114,7 @@ def test_record_by_device_id_date_outside(
     response = MagicMock()
     response.json = lambda: mock_inventory_history_response
 
-    with patch("requests.get", return_value=response):
+    with patch.object(inventory.session, "get", return_value=response):
         start_wear = utils.format_weartime("2021-03-17 12:11:55", "inventory")
         end_wear = utils.format_weartime("2021-03-17 22:11:55", "inventory")
 
@@ -85,10 +124,10 @@ def test_record_by_device_id_date_outside(
 
 
 def test_all_devices_by_type_cache_success(mock_inv_config: MagicMock) -> None:
-    inventory.all_devices_by_type.cache_clear()
+    inventory.refresh_devices()
     num_requests = 10
 
-    with patch("requests.get", return_value=MagicMock()) as get:
+    with patch.object(inventory.session, "get", return_value=MagicMock()) as get:
         for __ in range(0, num_requests):
             inventory.all_devices_by_type(utils.DeviceType.BTF)
 
@@ -98,11 +137,11 @@ def test_all_devices_by_type_cache_success(mock_inv_config: MagicMock) -> None:
 def test_device_id_by_serial_valid_result(
     mock_inventory_devices_bytype_response: dict, mock_inv_config: MagicMock
 ) -> None:
-    inventory.all_devices_by_type.cache_clear()
+    inventory.refresh_devices()
     response = MagicMock()
     response.json = lambda: mock_inventory_devices_bytype_response
 
-    with patch("requests.get", return_value=response):
+    with patch.object(inventory.session, "get", return_value=response):
 
         result = inventory.device_id_by_serial(utils.DeviceType.BTF, "ABC456")
 
@@ -112,15 +151,61 @@ def test_device_id_by_serial_valid_result(
 def test_device_id_by_serial_hit_cache_success(
     mock_inventory_devices_bytype_response: dict, mock_inv_config: MagicMock
 ) -> None:
-    inventory.all_devices_by_type.cache_clear()
+    inventory.refresh_devices()
     num_requests = 10
     response = MagicMock()
     response.json = lambda: mock_inventory_devices_bytype_response
 
-    with patch("requests.get", return_value=response):
+    with patch.object(inventory.session, "get", return_value=response) as get:
         for _ in range(0, num_requests):
-            inventory.all_devices_by_type(utils.DeviceType.BTF)
+            inventory.device_id_by_serial(utils.DeviceType.BTF, "ABC456")
+
+        get.assert_called_once()
+
+
+def test_device_id_by_serial_normalised_first_listed(
+    mock_inventory_devices_bytype_response: dict, mock_inv_config: MagicMock
+) -> None:
+    inventory.refresh_devices()
+    response = MagicMock()
+    response.json = lambda: mock_inventory_devices_bytype_response
+
+    with patch.object(inventory.session, "get", return_value=response):
+
+        result = inventory.device_id_by_serial(utils.DeviceType.BTF, " abc123")
+
+        # ABC123 is listed for two devices
+        assert result == "BTF-123456"
+
+
+def test_device_id_by_serial_unknown(
+    mock_inventory_devices_bytype_response: dict, mock_inv_config: MagicMock
+) -> None:
+    inventory.refresh_devices()
+    response = MagicMock()
+    response.json = lambda: mock_inventory_devices_bytype_response
+
+    with patch.object(inventory.session, "get", return_value=response):
+
+        result = inventory.device_id_by_serial(utils.DeviceType.BTF, "XYZ789")
+
+        assert result is None
+
+
+def test_devices_refreshed_when_expired(
+    mock_inventory_devices_bytype_response: dict, mock_inv_config: MagicMock
+) -> None:
+    inventory.refresh_devices()
+    response = MagicMock()
+    response.json = lambda: mock_inventory_devices_bytype_response
+
+    clock = [0.0]
 
-        result = inventory.all_devices_by_type.cache_info()
+    with patch.object(
+        inventory.session, "get", return_value=response
+    ) as get, patch.object(cache.time, "monotonic", lambda: clock[0]):
+        inventory.all_devices_by_type(utils.DeviceType.BTF)
+        clock[0] += config.services_cache_seconds
+        inventory.all_devices_by_type(utils.DeviceType.BTF)
 
-        assert result[0] == num_requests - 1
+        assert get.call_count == 2
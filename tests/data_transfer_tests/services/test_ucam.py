@@ -1,5 +1,10 @@
+from typing import Callable
 from unittest.mock import MagicMock, patch
 
+import pytest
+import requests
+
+from data_transfer.schemas import ucam as ucam_schemas
 from data_transfer.schemas.ucam import DiseaseType, PatientWithDevices
 from data_transfer.services import ucam
 from data_transfer.utils import format_weartime
@@ -11,7 +16,7 @@ def test_get_patient_success(
     mock_payload.update({"data": mock_data["patients"][0]})
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_one_patient("E-PATIENT")
 
@@ -31,7 +36,7 @@ def test_get_patient_not_found(mock_ucam_config: MagicMock, mock_payload: dict)
     )
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_one_patient("X-PATIENT")
 
@@ -46,7 +51,7 @@ def test_get_device_success(
     )
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_one_device("NR3-DEVICE")
 
@@ -63,7 +68,7 @@ def test_get_device_not_found(mock_ucam_config: MagicMock, mock_payload: dict) -
     )
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_one_device("NOT-DEVICE")
 
@@ -76,7 +81,7 @@ def test_get_vtt_success(
     mock_payload.update({"data": mock_data["vtt"]})
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_one_vtt("VTT_COMPLEX_HASH")
 
@@ -90,7 +95,7 @@ def test_get_vtts_success(
     mock_payload.update({"data": mock_data["vtt"]})
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_all_vtt()
 
@@ -103,7 +108,7 @@ def test_get_all_btfdots_success(
     mock_payload.update({"data": mock_data["btf_dots"]})
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_all_btf_dots()
 
@@ -118,7 +123,7 @@ def test_get_btfdot_success(
     )
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_one_btf_dot("NR1-BTFDOT")
 
@@ -135,7 +140,7 @@ def test_get_btfdot_not_found(mock_ucam_config: MagicMock, mock_payload: dict) -
     )
     get_response = MagicMock(json=lambda: mock_payload)
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.get_one_btf_dot("NOT-BTFDOT")
 
@@ -152,7 +157,7 @@ def test_get_patient_by_period_date_within(mock_data: dict, mock_payload: dict)
     start_wear = format_weartime("2020-06-20T00:00:00", "ucam")
     end_wear = format_weartime("2020-06-20T00:00:01", "ucam")
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.patient_by_wear_period(device_id, start_wear, end_wear)
 
@@ -171,7 +176,7 @@ def test_get_patient_btf_dots_by_period_date_within(
     start_wear = format_weartime("2020-07-22T00:00:00", "ucam")
     end_wear = format_weartime("2020-07-23T00:00:01", "ucam")
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.patient_by_btfdot_wear_period(device_id, start_wear, end_wear)
 
@@ -185,7 +190,7 @@ def test_get_patient_by_period_invalid_patient_id(mock_payload: dict) -> None:
     start_wear = format_weartime("2020-06-20T00:00:00", "ucam")
     end_wear = format_weartime("2020-06-20T00:00:01", "ucam")
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.patient_by_wear_period(device_id, start_wear, end_wear)
 
@@ -204,7 +209,7 @@ def test_get_patient_by_period_date_with_endwear_none(
     start_wear = format_weartime("2020-07-25T00:00:00", "ucam")
     end_wear = format_weartime("2020-07-26T00:00:00", "ucam")
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.patient_by_wear_period(device_id, start_wear, end_wear)
 
@@ -223,7 +228,7 @@ def test_get_patient_by_period_date_not_found(
     start_wear = format_weartime("2020-06-01T00:00:00", "ucam")
     end_wear = format_weartime("2020-06-01T00:00:00", "ucam")
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.patient_by_wear_period(device_id, start_wear, end_wear)
 
@@ -242,7 +247,7 @@ def test_get_patient_by_period_date_include_deviations(
     start_wear = format_weartime("2020-07-21T00:00:00", "ucam")
     end_wear = format_weartime("2020-07-21T00:00:01", "ucam")
 
-    with patch("requests.get", return_value=get_response):
+    with patch.object(ucam.session, "get", return_value=get_response):
 
         result = ucam.patient_by_wear_period(device_id, start_wear, end_wear)
 
@@ -256,7 +261,7 @@ def test_get_device_by_period_date_within(
     start_wear = format_weartime("2020-09-09T00:00:00", "ucam")
     end_wear = format_weartime("2020-09-09T00:00:01", "ucam")
 
-    result = ucam.device_by_wear_period(patient.devices, start_wear, end_wear)
+    result = ucam.device_by_wear_period(patient, start_wear, end_wear)
 
     assert result.device_id == "NR5-DEVICE"
 
@@ -268,7 +273,7 @@ def test_get_device_by_period_date_within_vtt(
     start_wear = format_weartime("2020-09-22T00:00:00", "ucam")
     end_wear = format_weartime("2020-09-22T00:00:01", "ucam")
 
-    result = ucam.device_by_wear_period(patient.devices, start_wear, end_wear)
+    result = ucam.device_by_wear_period(patient, start_wear, end_wear)
 
     assert result.device_id is None
     assert result.vttsma_id == "VTT_COMPLEX_HASH"
@@ -281,7 +286,7 @@ def test_get_device_by_period_date_outside(
     start_wear = format_weartime("2020-09-10T00:00:00", "ucam")
     end_wear = format_weartime("2020-09-13T00:00:01", "ucam")
 
-    result = ucam.device_by_wear_period(patient.devices, start_wear, end_wear)
+    result = ucam.device_by_wear_period(patient, start_wear, end_wear)
 
     assert result is None
 
@@ -293,6 +298,119 @@ def test_get_device_by_period_date_end_wear_none(
     start_wear = format_weartime("2020-09-29T00:00:00", "ucam")
     end_wear = format_weartime("2020-10-02T00:00:01", "ucam")
 
-    result = ucam.device_by_wear_period(patient.devices, start_wear, end_wear)
+    result = ucam.device_by_wear_period(patient, start_wear, end_wear)
 
     assert result.vttsma_id == "VTT_COMPLEX_HASH"
+
+
+def mock_snapshot_responses(mock_data: dict, mock_payload: dict) -> Callable:
+    def get(url: str) -> MagicMock:
+        data = mock_data["btf_dots"] if url.endswith("btf/") else mock_data["patients"]
+        return MagicMock(json=lambda: dict(mock_payload, data=data))
+
+    return get
+
+
+def test_snapshot_mode_serves_lookups(
+    mock_data: dict, mock_payload: dict, mock_ucam_config: MagicMock
+) -> None:
+    get = mock_snapshot_responses(mock_data, mock_payload)
+    start_wear = format_weartime("2020-07-25T00:00:00", "ucam")
+    end_wear = format_weartime("2020-07-26T00:00:00", "ucam")
+
+    with patch.object(ucam.session, "get", side_effect=get) as mock_get:
+        with ucam.snapshot_mode():
+            patient = ucam.patient_by_wear_period("NR3-DEVICE", start_wear, end_wear)
+            dot = ucam.patient_by_btfdot_wear_period("NR1-BTFDOT", start_wear, end_wear)
+            vtts = ucam.get_one_vtt("VTT_COMPLEX_HASH")
+            unknown = ucam.get_one_device("UNKNOWN-DEVICE")
+
+        result = mock_get.call_count
+
+    assert result == 2
+    assert patient.patient_id == "B-PATIENT"
+    assert dot.patient_id == "G-PATIENT"
+    assert [p.patient_id for p in vtts] == ["D-PATIENT", "F-PATIENT"]
+    assert unknown is None
+    assert ucam._snapshot is None
+
+
+def test_snapshot_devices_by_id(
+    mock_data: dict, mock_payload: dict, mock_ucam_config: MagicMock
+) -> None:
+    with patch.object(
+        ucam.session,
+        "get",
+        side_effect=mock_snapshot_responses(mock_data, mock_payload),
+    ):
+        ucam.load_snapshot()
+        result = ucam.get_one_device("NR3-DEVICE")
+        ucam.clear_snapshot()
+
+    assert len(result) == 1
+    assert result[0].device_id == "NR3-DEVICE"
+    assert len(result[0].patients) == 3
+
+
+def test_snapshot_not_loaded(mock_payload: dict, mock_ucam_config: MagicMock) -> None:
+    mock_payload.update({"data": None, "meta": {"success": False, "errors": []}})
+    get_response = MagicMock(json=lambda: mock_payload)
+
+    with patch.object(ucam.session, "get", return_value=get_response):
+        result = ucam.load_snapshot()
+
+    assert not result
+    assert ucam._snapshot is None
+
+
+def test_get_device_by_period_indexed_once(
+    mock_data: dict, mock_ucam_config: MagicMock
+) -> None:
+    patient = PatientWithDevices.serialize(mock_data["patients"][5])
+    start_wear = format_weartime("2020-09-09T00:00:00", "ucam")
+    end_wear = format_weartime("2020-09-09T00:00:01", "ucam")
+
+    with patch.object(ucam_schemas, "IntervalIndex") as interval_index:
+        for _ in range(3):
+            result = ucam.device_by_wear_period(patient, start_wear, end_wear)
+
+        assert result.device_id == "NR5-DEVICE"
+        interval_index.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "get_response",
+    [
+        # connection error
+        MagicMock(side_effect=requests.ConnectionError),
+        # invalid JSON
+        MagicMock(return_value=MagicMock(json=MagicMock(side_effect=ValueError))),
+        # success without data
+        MagicMock(return_value=MagicMock(json=lambda: {"meta": {"success": True}})),
+    ],
+)
+def test_snapshot_failed_response(
+    get_response: MagicMock, mock_ucam_config: MagicMock
+) -> None:
+    with patch.object(ucam.session, "get", get_response):
+        result = ucam.load_snapshot()
+
+    assert not result
+    assert ucam._snapshot is None
+
+
+def test_snapshot_failed_requests_per_id(
+    mock_ucam_config: MagicMock, mock_data: dict, mock_payload: dict
+) -> None:
+    devices = [d for d in mock_data["devices"] if d["device_id"] == "NR3-DEVICE"]
+
+    def get(url: str) -> MagicMock:
+        if url.endswith("patients"):
+            raise requests.ConnectionError
+        return MagicMock(json=lambda: dict(mock_payload, data=devices))
+
+    with patch.object(ucam.session, "get", side_effect=get):
+        with ucam.snapshot_mode():
+            result = ucam.get_one_device("NR3-DEVICE")
+
+    assert result[0].device_id == "NR3-DEVICE"
@@ -0,0 +1,81 @@
+from typing import Any, List, Tuple
+from unittest.mock import patch
+
+from data_transfer.utils import cache
+from data_transfer.utils.cache import CachedFunction, ttl_cache
+
+
+def counted(maxsize: int = 4, ttl: float = 60) -> Tuple[CachedFunction[Any], List[Any]]:
+    """A ttl_cache'd identity function and the arguments it was called with."""
+    calls: List[Any] = []
+
+    @ttl_cache(maxsize, ttl)
+    def func(key: Any) -> Any:
+        calls.append(key)
+        return key
+
+    return func, calls
+
+
+def test_ttl_cache_hits() -> None:
+    func, calls = counted()
+
+    values = [func(1), func(1), func(2), func(key=1)]
+
+    result = func.cache_info()
+
+    assert values == [1, 1, 2, 1]
+    assert len(calls) == 3
+    assert (result.hits, result.misses, result.currsize) == (1, 3, 3)
+
+
+def test_ttl_cache_expires() -> None:
+    clock = [0.0]
+
+    with patch.object(cache.time, "monotonic", lambda: clock[0]):
+        func, calls = counted(ttl=60)
+        func("key")
+        clock[0] += 59
+        func("key")
+        clock[0] += 1
+        func("key")
+
+    result = func.cache_info()
+
+    assert len(calls) == 2
+    assert result.expirations == 1
+
+
+def test_ttl_cache_evicts_least_recently_used() -> None:
+    func, calls = counted(maxsize=2)
+
+    for key in ["a", "b", "a", "c", "a", "b"]:
+        func(key)
+
+    result = func.cache_info()
+
+    assert calls == ["a", "b", "c", "b"]  # "b" evicted by "c"
+    assert result.evictions == 2
+
+
+def test_ttl_cache_invalidate() -> None:
+    func, calls = counted()
+
+    for key in ["a", "b"]:
+        func(key)
+    func.invalidate("a")
+    for key in ["a", "b"]:
+        func(key)
+
+    assert calls == ["a", "b", "a"]
+
+
+def test_clear_caches() -> None:
+    func, _ = counted()
+    func("a")
+
+    cache.clear_caches()
+
+    result = func.cache_info()
+
+    assert result.currsize == 0
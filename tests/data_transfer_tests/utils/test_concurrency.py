@@ -0,0 +1,130 @@
+import threading
+from typing import Iterator
+from unittest.mock import patch
+
+from data_transfer.utils import concurrency
+from data_transfer.utils.concurrency import (
+    RateLimiter,
+    iter_concurrently,
+    run_concurrently,
+)
+
+
+def test_run_concurrently_ordered_results() -> None:
+    result = run_concurrently(lambda x: x * 2, range(10), max_workers=4)
+
+    assert result == [x * 2 for x in range(10)]
+
+
+def test_run_concurrently_bounded_workers() -> None:
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    # each task waits for two others to run at once (raising if they do not)
+    overlapping = threading.Barrier(3, timeout=10)
+
+    def task(_: int) -> None:
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        overlapping.wait()
+        with lock:
+            running[0] -= 1
+
+    run_concurrently(task, range(21), max_workers=3)
+
+    assert peak[0] == 3
+
+
+def test_run_concurrently_rate_limited() -> None:
+    limiter = RateLimiter(rate=1000)
+
+    with patch.object(limiter, "acquire", wraps=limiter.acquire) as acquire:
+        run_concurrently(lambda x: x, range(5), max_workers=2, limiter=limiter)
+
+    assert acquire.call_count == 5
+
+
+def test_iter_concurrently_yields_as_completed() -> None:
+    yielded = [threading.Event() for _ in range(3)]
+
+    def task(order: int) -> int:
+        # completes only once the result before it was yielded
+        if order:
+            assert yielded[order - 1].wait(timeout=10)
+        return order
+
+    result = []
+    for order in iter_concurrently(task, [2, 0, 1], max_workers=3):
+        result.append(order)
+        yielded[order].set()
+
+    assert result == [0, 1, 2]
+
+
+def test_iter_concurrently_consumes_items_incrementally() -> None:
+    consumed = []
+
+    def items() -> Iterator[int]:
+        for item in range(100):
+            consumed.append(item)
+            yield item
+
+    results = iter_concurrently(lambda x: x, items(), max_workers=2)
+    next(results)
+
+    result = len(consumed)
+
+    assert result < 10
+    assert len(list(results)) == 99
+
+
+def test_rate_limiter_burst_then_waits() -> None:
+    clock = [0.0]
+    sleeps = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    with patch.object(concurrency.time, "monotonic", lambda: clock[0]), patch.object(
+        concurrency.time, "sleep", sleep
+    ):
+        limiter = RateLimiter(rate=10, capacity=3)
+        for _ in range(5):
+            limiter.acquire()
+
+    result = sum(sleeps)
+
+    assert len(sleeps) == 2  # burst of 3, then wait for each refill
+    assert round(result, 6) == 0.2
+
+
+def test_rate_limiter_throttled_pauses_and_halves() -> None:
+    clock = [0.0]
+    sleeps = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    with patch.object(concurrency.time, "monotonic", lambda: clock[0]), patch.object(
+        concurrency.time, "sleep", sleep
+    ):
+        limiter = RateLimiter(rate=10)
+        limiter.throttled(retry_after=2)
+        limiter.acquire()
+
+    result = sum(sleeps)
+
+    assert limiter.rate == 5
+    assert round(result, 6) == 2.2  # retry_after and one interval at the new rate
+
+
+def test_rate_limiter_recovers_to_max_rate() -> None:
+    limiter = RateLimiter(rate=10)
+    limiter.throttled(retry_after=0)
+
+    for _ in range(20):
+        limiter.succeeded()
+
+    assert limiter.rate == 10
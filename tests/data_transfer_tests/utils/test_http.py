@@ -0,0 +1,178 @@
+import gzip
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+import requests
+import requests_mock
+from requests.adapters import HTTPAdapter
+
+from data_transfer.utils import http
+
+
+def test_build_session_pools_connections() -> None:
+    session = http.build_session(pool_size=4, retries=2)
+
+    result = session.get_adapter("https://api.vendor.com/")
+
+    assert result is session.get_adapter("http://api.vendor.com/")
+    assert isinstance(result, HTTPAdapter)
+    assert result._pool_maxsize == 4
+    assert result.max_retries.total == 2
+    assert 429 not in result.max_retries.status_forcelist
+
+
+def test_download(tmp_path: Path) -> None:
+    session = requests.Session()
+    adapter = requests_mock.Adapter()
+    adapter.register_uri("GET", "mock://vendor/file", content=b"0123456789" * 10)
+    session.mount("mock://", adapter)
+    path = tmp_path / "file.csv"
+
+    result = http.download(session, "mock://vendor/file", path, buffer_size=16)
+
+    assert result == 100
+    assert path.read_bytes() == b"0123456789" * 10
+    assert not (tmp_path / "file.csv.part").exists()
+
+
+def test_download_failed(tmp_path: Path) -> None:
+    session = requests.Session()
+    adapter = requests_mock.Adapter()
+    adapter.register_uri("GET", "mock://vendor/file", status_code=404)
+    session.mount("mock://", adapter)
+    path = tmp_path / "file.csv"
+
+    with pytest.raises(requests.HTTPError):
+        http.download(session, "mock://vendor/file", path)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def file_server(
+    content: bytes, etag: Optional[str] = '"etag"'
+) -> Tuple[requests.Session, List[Dict[str, Any]]]:
+    """Serves content at mock://vendor/file, by Range if requested."""
+    session = requests.Session()
+    adapter = requests_mock.Adapter()
+    requests_headers: List[Dict[str, Any]] = []
+
+    def callback(
+        request: requests_mock.request._RequestObjectProxy,
+        context: requests_mock.response._Context,
+    ) -> bytes:
+        requests_headers.append(dict(request.headers))
+        if etag:
+            context.headers["ETag"] = etag
+        requested = str(request.headers.get("Range", ""))
+        if match := re.match(r"bytes=(\d+)-(\d*)", requested):
+            start = int(match[1])
+            end = int(match[2]) if match[2] else len(content) - 1
+            context.status_code = 206
+            context.headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+            return content[start : end + 1]
+        return content
+
+    adapter.register_uri("GET", "mock://vendor/file", content=callback)
+    session.mount("mock://", adapter)
+    return session, requests_headers
+
+
+def test_download_resumed(tmp_path: Path) -> None:
+    session, requests_headers = file_server(b"0123456789" * 10)
+    path = tmp_path / "file.h5"
+    (tmp_path / "file.h5.part").write_bytes(b"0123456789" * 4)
+    (tmp_path / "file.h5.part.json").write_text('{"etag": "\\"etag\\"", "size": 100}')
+
+    result = http.download(session, "mock://vendor/file", path)
+
+    assert result == 100
+    assert path.read_bytes() == b"0123456789" * 10
+    assert requests_headers[0]["Range"] == "bytes=40-"
+    assert requests_headers[0]["If-Range"] == '"etag"'
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_download_incomplete_kept(tmp_path: Path) -> None:
+    session = requests.Session()
+    adapter = requests_mock.Adapter()
+    headers = {"Content-Length": "100", "ETag": '"etag"'}
+    adapter.register_uri(
+        "GET", "mock://vendor/file", content=b"0" * 40, headers=headers
+    )
+    session.mount("mock://", adapter)
+    path = tmp_path / "file.h5"
+
+    with pytest.raises(IOError):
+        http.download(session, "mock://vendor/file", path)
+
+    assert not path.exists()
+    assert (tmp_path / "file.h5.part").stat().st_size == 40
+    assert json.loads((tmp_path / "file.h5.part.json").read_text())["size"] == 100
+
+
+def test_download_incomplete_resumed(tmp_path: Path) -> None:
+    session = requests.Session()
+    adapter = requests_mock.Adapter()
+    headers = {"Content-Length": "100", "ETag": '"etag"'}
+    adapter.register_uri(
+        "GET", "mock://vendor/file", content=b"0123456789" * 4, headers=headers
+    )
+    session.mount("mock://", adapter)
+    path = tmp_path / "file.h5"
+    with pytest.raises(IOError):
+        http.download(session, "mock://vendor/file", path, buffer_size=16)
+    session, requests_headers = file_server(b"0123456789" * 10)
+
+    result = http.download(session, "mock://vendor/file", path)
+
+    assert result == 100
+    assert path.read_bytes() == b"0123456789" * 10
+    assert requests_headers[0]["Range"] == "bytes=40-"
+
+
+def test_download_skipped_when_complete(tmp_path: Path) -> None:
+    session, requests_headers = file_server(b"0123456789" * 10)
+    path = tmp_path / "file.h5"
+    path.write_bytes(b"9876543210" * 10)
+
+    result = http.download(session, "mock://vendor/file", path)
+
+    assert result == 100
+    assert path.read_bytes() == b"9876543210" * 10
+    assert [h["Range"] for h in requests_headers] == ["bytes=0-0"]
+
+
+def test_download_decoded(tmp_path: Path) -> None:
+    session = requests.Session()
+    adapter = requests_mock.Adapter()
+    adapter.register_uri(
+        "GET",
+        "mock://vendor/file",
+        content=gzip.compress(b"0123456789" * 10),
+        headers={"Content-Encoding": "gzip"},
+    )
+    session.mount("mock://", adapter)
+    path = tmp_path / "file.csv"
+
+    result = http.download(session, "mock://vendor/file", path, buffer_size=16)
+
+    assert result == 100
+    assert path.read_bytes() == b"0123456789" * 10
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_download_restarted_without_etag(tmp_path: Path) -> None:
+    session, requests_headers = file_server(b"0123456789" * 10, etag=None)
+    path = tmp_path / "file.h5"
+    # the .part of an earlier (80 bytes) version of the file
+    (tmp_path / "file.h5.part").write_bytes(b"9876543210" * 4)
+    (tmp_path / "file.h5.part.json").write_text('{"etag": null, "size": 80}')
+
+    result = http.download(session, "mock://vendor/file", path)
+
+    assert result == 100
+    assert path.read_bytes() == b"0123456789" * 10
+    assert [h.get("Range") for h in requests_headers] == ["bytes=40-", None]
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+from data_transfer.utils.intervals import IntervalIndex
+
+
+def day(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def test_find_within_period_by_day() -> None:
+    index = IntervalIndex(
+        [
+            ("B", day("2021-02-01T12:00"), day("2021-02-10T08:00")),
+            ("A", day("2021-01-01T12:00"), day("2021-01-10T08:00")),
+        ]
+    )
+
+    result = index.find(day("2021-02-01T00:00"), day("2021-02-10T23:59"))
+
+    assert result == "B"
+
+
+def test_find_outside_periods() -> None:
+    index = IntervalIndex([("A", day("2021-01-01"), day("2021-01-10"))])
+
+    result = [
+        index.find(day("2020-12-31"), day("2021-01-02")),
+        index.find(day("2021-01-09"), day("2021-01-11")),
+        index.find(day("2021-01-11"), day("2021-01-12")),
+    ]
+
+    assert result == [None, None, None]
+
+
+def test_find_open_period_until_today() -> None:
+    index = IntervalIndex([("A", day("2021-01-01"), None)])
+    tomorrow = datetime.today() + timedelta(days=1)
+
+    result = index.find(datetime.today(), datetime.today())
+
+    assert result == "A"
+    assert index.find(datetime.today(), tomorrow) is None
+
+
+def test_find_overlapping_first_given() -> None:
+    index = IntervalIndex(
+        [
+            ("A", day("2021-01-05"), day("2021-01-20")),
+            ("B", day("2021-01-01"), day("2021-01-31")),
+            ("C", day("2021-01-08"), day("2021-01-12")),
+        ]
+    )
+
+    result = index.find(day("2021-01-10"), day("2021-01-11"))
+
+    assert result == "A"
+    assert index.find(day("2021-01-02"), day("2021-01-03")) == "B"
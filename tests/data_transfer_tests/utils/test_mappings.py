@@ -0,0 +1,67 @@
+import os
+from pathlib import Path
+from typing import Generator
+from unittest.mock import patch
+
+import pytest
+
+from data_transfer.utils import mappings
+
+
+@pytest.fixture(autouse=True)
+def mock_mappings() -> Generator[None, None, None]:
+    with patch.dict(mappings.mappings, clear=True):
+        yield
+
+
+@pytest.fixture
+def devices_csv(tmp_path: Path) -> Path:
+    path = tmp_path / "dreem_devices.csv"
+    path.write_text("value,hash\nDRM-123456,uuid-1\nDRM-654321,uuid-2\n")
+    return path
+
+
+def test_value_by_key_by_header(devices_csv: Path) -> None:
+    result = mappings.value_by_key(devices_csv, "uuid-2", "hash", "value")
+
+    assert result == "DRM-654321"
+
+
+def test_key_by_value_by_position(devices_csv: Path) -> None:
+    result = mappings.key_by_value(devices_csv, "uuid-1")
+
+    assert result == "DRM-123456"
+
+
+def test_value_by_key_unknown(devices_csv: Path) -> None:
+    result = mappings.value_by_key(devices_csv, "uuid-3", "hash", "value")
+
+    assert result is None
+
+
+def test_load_reads_once(devices_csv: Path) -> None:
+    with patch.object(mappings.csv, "reader", wraps=mappings.csv.reader) as reader:
+        for _ in range(10):
+            mappings.value_by_key(devices_csv, "uuid-1", "hash", "value")
+
+        reader.assert_called_once()
+
+
+def test_load_reads_again_when_modified(devices_csv: Path) -> None:
+    mappings.value_by_key(devices_csv, "uuid-1", "hash", "value")
+    devices_csv.write_text("value,hash\nDRM-ABCDEF,uuid-1\n")
+    modified = devices_csv.stat().st_mtime_ns + 1_000_000_000
+    os.utime(devices_csv, ns=(modified, modified))
+
+    result = mappings.value_by_key(devices_csv, "uuid-1", "hash", "value")
+
+    assert result == "DRM-ABCDEF"
+
+
+def test_load_first_listed(tmp_path: Path) -> None:
+    path = tmp_path / "ID_corrections.csv"
+    path.write_text("incorrect,correct\nK-ABCDEF,K-NXYP6F\nK-ABCDEF,K-OTHER1\n")
+
+    result = mappings.value_by_key(path, "K-ABCDEF")
+
+    assert result == "K-NXYP6F"
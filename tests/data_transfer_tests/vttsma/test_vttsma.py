@@ -0,0 +1,52 @@
+from math import ceil
+from unittest.mock import patch
+
+import mongomock
+import pytest
+
+from data_transfer.db import main as db
+from data_transfer.devices import vttsma
+
+
+def run_download_metadata(num_patients: int, num_records: int) -> dict:
+    """
+    Ingest a synthetic bucket listing of which half of the patients are known,
+    against a collection of num_records records. Returns call counts.
+    """
+    mock_db = mongomock.MongoClient().db
+    known = [f"patient_{i}" for i in range(0, num_patients, 2)]
+    padding = [f"other_{i}" for i in range(num_records - len(known))]
+    mock_db.records.insert_many([{"hash": h} for h in known + padding])
+
+    listing = [
+        dict(id=f"patient_{i}", exports=["data_2021_03_22"])
+        for i in range(num_patients)
+    ]
+
+    with patch.object(db, "_db", mock_db), patch.object(
+        vttsma.Vttsma, "authenticate"
+    ), patch.object(vttsma.vttsma_api, "get_list", return_value=listing), patch.object(
+        vttsma.ucam, "get_one_vtt", return_value=[None]
+    ) as get_one_vtt, patch.object(
+        mock_db.records, "find", wraps=mock_db.records.find
+    ) as find:
+        vttsma.Vttsma().download_metadata()
+
+    return dict(queries=find.call_count, unknown=get_one_vtt.call_count)
+
+
+def test_download_metadata_unknown_records() -> None:
+    result = run_download_metadata(100, 1000)
+
+    assert result["queries"] == 1
+    assert result["unknown"] == 50
+
+
+@pytest.mark.benchmark
+def test_download_metadata_bounded_queries() -> None:
+    num_patients = 10_000
+
+    result = run_download_metadata(num_patients, 100_000)
+
+    assert result["queries"] <= ceil(num_patients / db.HASH_BATCH_SIZE)
+    assert result["unknown"] == num_patients // 2